@@ -15,13 +15,26 @@ import math # Added for charts
 import customtkinter as ctk # MODERN UI
 from PIL import Image, ImageTk
 import gspread
-from openpyxl.styles import Font # Fix for Excel Export
+from openpyxl.styles import Font, PatternFill # Fix for Excel Export
 from oauth2client.service_account import ServiceAccountCredentials
 import threading
 import logging
 import traceback
 import re
 import uuid
+import sqlite3
+import itertools
+import queue
+import hashlib
+import zlib
+import collections
+import socket
+import array
+import bisect
+import contextlib
+import sys
+
+APP_START = time.perf_counter() # Ishga tushish metrikasi uchun
 
 # Log yozishni sozlash
 logging.basicConfig(filename='app.log', level=logging.DEBUG, 
@@ -32,19 +45,1356 @@ logging.basicConfig(filename='app.log', level=logging.DEBUG,
 DB_FILE = "mahalla_bazasi.json"
 TRASH_FILE = "trash.json"
 BACKUP_DIR = "backups"
+BACKUP_KEEP_HOURS = 48 # Oxirgi 48 soat: har soatdan bittadan snapshot
+BACKUP_KEEP_DAYS = 60  # 60 kungacha: har kundan bittadan, undan eskisi: har oydan bittadan
+BACKUP_GC_GRACE_SECONDS = 3600 # Shundan yangi bo'lak/.tmp o'chirilmaydi: boshqa nusxa hozir snapshot yozayotgan bo'lishi mumkin
 LOG_FILE = "activity_log.json"
 SETTINGS_FILE = "settings.json"
+JOURNAL_FILE = "mahalla_bazasi.journal" # O'zgarishlar jurnali (har qatorda bitta amal)
+JOURNAL_COMPACT_LIMIT = 500 # Shundan ko'p amal yig'ilsa, jurnal bazaga birlashtiriladi
+SQLITE_FILE = "pop_tuman.db" # SQLite rejimi (settings.json: "storage": "sqlite")
+DERIVED_CACHE_FILE = "mahalla_bazasi.cache" # Qidiruv/dashboard uchun hisoblangan qiymatlar
+LOCK_FILE = "mahalla_bazasi.lock" # Umumiy papkada bir nechta nusxa ishlaganda yozish qulfi
+LOCK_STALE_SECONDS = 30 # Shundan eski qulf (dastur qulab tushgan) olib tashlanadi
+REMOTE_POLL_SECONDS = 2 # Boshqa nusxalar o'zgarishlarini tekshirish oralig'i
+ROTATED_JOURNAL_KEEP_SECONDS = 3600 # Eski jurnal nusxalari (boshqa nusxalar o'qib ulgurishi uchun)
+STREAM_LOAD_MIN_BYTES = 4 * 1024 * 1024 # Bundan katta baza bo'laklab o'qiladi
+TABLE_OVERSCAN = 20 # Virtual jadval: ko'rinib turgan qatorlardan yuqori/pastda shuncha qator ham chiziladi
+TABLE_MIN_ROWS = 40 # Jadval hali ekranga chiqmagan (balandligi noma'lum) bo'lsa, oyna shuncha qator
+SEARCH_DEBOUNCE_MS = 250 # Qidiruv oynasida yozish to'xtagach shuncha kutib, fonda qidiriladi
+FILTER_CACHE_SIZE = 32 # Oxirgi shuncha qidiruv natijasi xotirada (LRU)
+FUZZY_FIELDS = ("m", "f") # "~" bilan boshlangan qidiruv (xatoga chidamli) shu maydonlarda ishlaydi
+FUZZY_PREFIX = 7 # SymSpell: so'zning faqat boshidagi shuncha harfidan o'chirishlar indekslanadi
+PHONE_SUFFIX_MIN = 4 # Telefon qidiruvi: kamida shuncha oxirgi raqam (kamrog'i - oddiy qidiruv)
+SEARCH_SCAN_CHUNK = 2000 # Oddiy qidiruvda har shuncha yozuvdan keyin bekor qilinganmi tekshiriladi
+COMPLETION_LIMIT = 8 # Forma maydonida ko'rsatiladigan tavsiyalar soni
+SCHEMA_VERSION = 2 # Baza sxemasi: 1 - eski oddiy massiv, 2 - {"schema_version", "records"}
+
+# Eski kategoriya nomlari -> hozirgi nomlar (migratsiyada bir marta almashtiriladi)
+CATEGORY_ALIASES = {
+    "Mahalla": "Mahalla (MFY)",
+    "MFY": "Mahalla (MFY)",
+    "Maktablar": "Maktab",
+    "MTT": "Bog'cha (MTT)",
+    "Bog'cha": "Bog'cha (MTT)",
+}
+MAHALLA_CATEGORY = "Mahalla (MFY)"
+# Har MFY da bo'lishi kerak bo'lgan xodimlar (mahalla bilan bir xil INN yoki nom)
+MAHALLA_ROLES = ("Hokim yordamchisi", "Yoshlar yetakchisi", "Ijtimoiy xodim", "Xotin qizlar")
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orgs (
+    pos INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid TEXT NOT NULL,
+    s TEXT, m TEXT, f TEXT, t TEXT, inn TEXT, izoh TEXT,
+    extra TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orgs_uuid ON orgs(uuid);
+CREATE INDEX IF NOT EXISTS idx_orgs_inn ON orgs(inn);
+CREATE INDEX IF NOT EXISTS idx_orgs_s ON orgs(s);
+CREATE INDEX IF NOT EXISTS idx_orgs_m ON orgs(m);
+
+CREATE TABLE IF NOT EXISTS trash (
+    pos INTEGER PRIMARY KEY AUTOINCREMENT,
+    uuid TEXT,
+    s TEXT, m TEXT, f TEXT, t TEXT, inn TEXT, izoh TEXT,
+    extra TEXT,
+    deleted_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trash_uuid ON trash(uuid);
+
+CREATE TABLE IF NOT EXISTS activity_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    time TEXT, user TEXT, action TEXT, details TEXT
+);
+
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    src TEXT, op TEXT
+);
+"""
 
 import time
 import shutil
 
-class DataManager:
+def snapshot_of(data):
+    # list()/dict() nusxalash GIL ostida atomar: UI oqimi shu payt o'zgartirsa ham buzilmaydi
+    if isinstance(data, dict):
+        return {k: snapshot_of(v) if isinstance(v, list) else v for k, v in dict(data).items()}
+    return [dict(i) if isinstance(i, dict) else i for i in list(data)]
+
+def atomic_write(path, text):
+    # Avval vaqtinchalik faylga, keyin os.replace: yarim yozilgan baza hech qachon qolmaydi
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    for attempt in range(3):
+        try:
+            os.replace(tmp, path)
+            return
+        except PermissionError:
+            # Windows: fayl boshqa dastur (antivirus) tomonidan band bo'lishi mumkin
+            if attempt == 2: raise
+            time.sleep(0.1)
+
+# Sarlavha maydonlari (schema_version, journal_epoch, folded) "records" dan oldin yoziladi
+DB_HEADER_RE = re.compile(r'\{(?:\s*"\w+"\s*:\s*(?:\d+|"[^"]*"|true|false|null)\s*,)*\s*"records"\s*:\s*')
+
+def iter_json_array(path, chunk_size=65536):
+    # JSON massiv elementlarini fayldan bittalab o'qish: butun faylni xotiraga olib parse qilish shart emas
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, eof, started = "", 0, False, False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,": pos += 1
+            if pos >= len(buf):
+                if eof: raise ValueError(f"{path}: JSON massiv tugallanmagan")
+                buf, pos = f.read(chunk_size), 0
+                eof = not buf
+                continue
+            if not started:
+                if buf[pos] == "{":
+                    # Versiyalangan baza: {"schema_version": N, "records": [...]}
+                    m = DB_HEADER_RE.match(buf, pos)
+                    if not m: raise ValueError(f"{path}: baza sarlavhasi tanilmadi")
+                    pos = m.end()
+                    continue
+                if buf[pos] != "[": raise ValueError(f"{path}: JSON massiv kutilgan")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]": return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                if end == len(buf) and not eof: raise ValueError # Bo'lak chegarasida kesilgan bo'lishi mumkin
+            except ValueError:
+                if eof: raise
+                more = f.read(chunk_size)
+                buf, pos, eof = buf[pos:] + more, 0, not more
+                continue
+            yield obj
+            pos = end
+
+def db_header(path):
+    # Sarlavha maydonlarini o'qish (butun faylni parse qilmasdan); eski massiv faylda {}
+    with open(path, "r", encoding="utf-8") as f:
+        m = re.match(r'\s*(\{.*?)"records"\s*:', f.read(512), re.S)
+    return json.loads(m.group(1) + '"records": []}') if m else {}
+
+def unwrap_db(obj):
+    # (versiya, yozuvlar): eski fayl oddiy massiv, yangisi sarlavhali obyekt. Boshqa narsa - ValueError
+    if isinstance(obj, dict) and isinstance(obj.get("records", []), list): return obj.get("schema_version", 1), obj.get("records", [])
+    if isinstance(obj, list): return 1, obj
+    raise ValueError("baza formati noto'g'ri")
+
+def canonical_category(s):
+    s = str(s or "").strip()
+    return CATEGORY_ALIASES.get(s, s)
+
+def normalize_inn(inn):
+    # INN doim matn: 301234567 (int), 301234567.0 (Excel dan float) -> "301234567"
+    if inn is None: return ""
+    if isinstance(inn, float) and inn.is_integer(): inn = int(inn)
+    return str(inn).strip()
+
+# Qidiruv so'rovi: turi:Maktab inn:2027* tel:916 izoh:"" -f:Ismoilov
+QUERY_FIELDS = {"nomi": "m", "m": "m", "fish": "f", "f.i.sh": "f", "f": "f", "inn": "inn",
+                "tel": "t", "t": "t", "izoh": "izoh", "turi": "s", "s": "s", "kategoriya": "s"}
+QUERY_TOKEN_RE = re.compile(r'(-?)(?:([^\s:"]+):)?(?:"([^"]*)"?|(\S+))')
+
+def parse_query(text, field, custom_columns=()):
+    # -> [(maydon, qiymat, prefiks?, inkor?)] yoki None (oddiy so'z: bitta maydon bo'yicha eski qidiruv).
+    # Maydonsiz so'zlar field (f_type dagi maydon) bo'yicha; "qiymat*" - shu bilan boshlanadi; "" - bo'sh maydon.
+    fields = dict(QUERY_FIELDS, **{c.lower(): c for c in custom_columns})
+    terms, qualified = [], False
+    for neg, key, quoted, word in QUERY_TOKEN_RE.findall(text):
+        value = quoted if quoted or word == "" else word
+        if key and key.lower() not in fields: # "http://..." kabi: oddiy matn
+            value, key = f"{key}:{value}", ""
+        if not key and not value: continue
+        prefix = not quoted and value.endswith("*")
+        if prefix: value = value.rstrip("*")
+        qualified = qualified or bool(key or neg or prefix or (quoted and not word))
+        terms.append((fields[key.lower()] if key else field, search_key(value), prefix, bool(neg)))
+    return terms if qualified else None
+
+def query_term_ok(text, value, prefix):
+    # Bitta so'rov sharti (telefondan boshqa maydon): "" - bo'sh, "qiymat*" - boshlanadi, aks holda - ichida bor
+    if not value: return not text.strip()
+    return text.startswith(value) if prefix else value in text
+
+# Qidiruv kaliti: kichik harf, apostrof turlari va ъ/ь tashlanadi, kirill -> lotin.
+# "Qo'shtepa", "Qoʻshtepa", "Қўштепа" -> "qoshtepa"
+SEARCH_FOLD = str.maketrans({
+    "'": "", "ʻ": "", "ʼ": "", "`": "", "‘": "", "’": "", "ʹ": "", "ъ": "", "ь": "",
+    "а": "a", "б": "b", "в": "v", "г": "g", "ғ": "g", "д": "d", "е": "e", "ё": "yo", "ж": "j",
+    "з": "z", "и": "i", "й": "y", "к": "k", "қ": "q", "л": "l", "м": "m", "н": "n", "о": "o",
+    "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ў": "o", "ф": "f", "х": "x", "ҳ": "h",
+    "ц": "s", "ч": "ch", "ш": "sh", "щ": "sh", "ы": "i", "э": "e", "ю": "yu", "я": "ya"})
+CYRILLIC_YE_RE = re.compile(r"(?<![бвгғджзйкқлмнпрстфхҳцчшщ])е") # So'z boshida / unlidan keyin "ye"
+
+def search_key(text):
+    text = str(text).lower()
+    if "е" in text: text = CYRILLIC_YE_RE.sub("ye", text)
+    return text.translate(SEARCH_FOLD)
+
+def canonical_phone(raw):
+    # Telefon -> "+998XXXXXXXXX" (show_qr qoidalari). Tushunarsiz/qisqa raqam - boricha (faqat raqamlar)
+    digits = "".join(filter(str.isdigit, str(raw)))
+    if len(digits) == 9: return "+998" + digits # Lokal (avval: "99 981 59 90" ichida ham "998" bor)
+    if digits.startswith("00998"): digits = digits[2:] # 00998... = +998...
+    if digits.startswith("998") and len(digits) > 9: return "+" + digits[:12] # Davlat kodi faqat boshida
+    if len(digits) > 9: return "+998" + digits[-9:] # 835... kabi: oxirgi 9 ta raqam
+    return digits
+
+def phone_query(text):
+    # Qidiruvdagi raqam: to'liq raqam bo'lsa kodsiz 9 ta raqamga keltiriladi, aks holda oxirgi raqamlar
+    digits = "".join(filter(str.isdigit, str(text)))
+    if len(digits) >= 9: digits = canonical_phone(digits).replace("+998", "", 1)
+    return digits[-9:]
+
+def phone_national(canon):
+    return canon.replace("+998", "", 1).lstrip("+")
+
+def phone_suffixes(canon):
+    # Teskari qidiruv kalitlari: kodsiz raqamning oxirgi 4..9 ta raqami
+    national = phone_national(canon)
+    return {national[-k:] for k in range(PHONE_SUFFIX_MIN, min(len(national), 9) + 1)}
+
+def phone_match(canon, digits):
+    # digits - phone_query natijasi: 4+ raqam - raqam oxiri (qo'ng'iroq qilgan raqam), kamroq - istalgan joyida
+    national = phone_national(canon)
+    return national.endswith(digits) if len(digits) >= PHONE_SUFFIX_MIN else digits in national
+
+def normalize_fields(fields):
+    # Tahrir/qo'shishda kelgan qiymatlarni sxema ko'rinishiga keltirish
+    if "s" in fields: fields["s"] = canonical_category(fields["s"])
+    if "inn" in fields: fields["inn"] = normalize_inn(fields["inn"])
+    return fields
+
+def migrate_v2(records):
+    # 1 -> 2: kategoriyalar hozirgi nomlarga, har yozuvga UUID, INN matn ko'rinishida
+    for r in records:
+        normalize_fields(r)
+        if not r.get("uuid"): r["uuid"] = str(uuid.uuid4())
+
+MIGRATIONS = {2: migrate_v2} # {yangi versiya: oldingi versiyadan o'tkazuvchi funksiya}
+
+def migrate_records(records, version):
+    # Yozuvlarni joyida eng so'nggi sxemaga o'tkazish; hech narsa qilinmasa False
+    if version >= SCHEMA_VERSION: return False
+    for v in range(version + 1, SCHEMA_VERSION + 1):
+        MIGRATIONS[v](records)
+    logging.info(f"Sxema migratsiyasi: {version} -> {SCHEMA_VERSION}, {len(records)} ta yozuv")
+    return True
+
+def read_json_head(path, n):
+    # Massivning dastlabki n ta elementi (faoliyat tarixi yangidan eskiga saqlanadi)
+    if not os.path.exists(path): return []
+    try:
+        return list(itertools.islice(iter_json_array(path), n))
+    except Exception as e:
+        logging.error(f"{path} boshini o'qib bo'lmadi: {e}")
+        return []
+
+class FileLock:
+    # Maslahat qulfi: O_EXCL bilan yaratilgan fayl (tarmoq papkalarida ham ishlaydi).
+    # Bir jarayon ichidagi oqimlar uchun ham: qulf faylini faqat bittasi yarata oladi.
+    # Ushlab turilganda fon oqimi fayl vaqtini yangilab turadi: katta bazani sekin yozish paytida
+    # boshqa nusxa uni "eski" deb olib tashlamaydi; eskirish faqat egasi qulab tushganda bo'ladi.
+    # Faylda egasining tokeni: bo'shatish/yangilash faqat o'z qulfiga tegadi.
+    def __init__(self, path=LOCK_FILE, stale=LOCK_STALE_SECONDS):
+        self.path = path
+        self.stale = stale
+        self.stop = threading.Event()
+        self.token = None
+
+    @staticmethod
+    def read_owner(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f: return f.read()
+        except OSError:
+            return None
+
+    def owned(self):
+        content = self.read_owner(self.path)
+        return bool(self.token and content and content.split()[-1] == self.token)
+
+    def acquire(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            token = uuid.uuid4().hex
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, f"{socket.gethostname()} {os.getpid()} {time.time():.0f} {token}".encode("utf-8"))
+                os.close(fd)
+                self.token = token
+                self.stop = threading.Event()
+                threading.Thread(target=self.heartbeat, args=(self.stop,), name="LockHeartbeat", daemon=True).start()
+                return True
+            except FileExistsError:
+                try:
+                    age = time.time() - os.path.getmtime(self.path)
+                except OSError:
+                    continue # Shu orada bo'shatildi
+                if age > self.stale:
+                    self.break_stale(age)
+                    continue
+                if time.monotonic() >= deadline: return False
+                time.sleep(0.05)
+
+    def break_stale(self, age):
+        # Eski qulfni o'chirmaymiz, noyob nomga ko'chiramiz: ikki nusxa bir vaqtda buzsa ham
+        # faqat bittasi ko'chira oladi, ikkinchisi esa yangi (boshqaning) qulfini o'chirib yubormaydi
+        seen = self.read_owner(self.path)
+        moved = f"{self.path}.stale-{uuid.uuid4().hex}"
+        try:
+            os.rename(self.path, moved)
+        except OSError:
+            return # Boshqa nusxa ulgurdi
+        if self.read_owner(moved) == seen:
+            logging.warning(f"Eski qulf olib tashlandi ({self.path}, {age:.0f} s)")
+        else:
+            # Shu orada boshqa nusxa yangi qulf olgan ekan - uni joyiga qaytaramiz
+            try: os.link(moved, self.path)
+            except OSError: pass
+        try: os.remove(moved)
+        except OSError: pass
+
+    def heartbeat(self, stop):
+        while not stop.wait(self.stale / 3):
+            if not self.owned():
+                logging.warning(f"Qulf boshqa nusxaga o'tgan ({self.path})")
+                return
+            try: os.utime(self.path)
+            except OSError: return
+
+    def release(self):
+        self.stop.set()
+        if not self.owned():
+            logging.warning(f"Qulf bizniki emas, o'chirilmadi ({self.path})")
+            self.token = None
+            return
+        self.token = None
+        try: os.remove(self.path)
+        except OSError: pass
+
+class PersistWriter:
+    # Fon oqimida diskka yozuvchi (write-behind).
+    # Bir faylga ketma-ket kelgan saqlashlar bitta yozuvga birlashadi, UI oqimi diskni kutmaydi.
+    # lock - yozish paytida olinadigan FileLock; on_reset - jurnalni tozalaydigan snapshotni
+    # o'zi yozadigan funksiya (False qaytarsa, keyinroq qayta urinish).
+    def __init__(self, delay=0.5, lock=None, on_reset=None):
+        self.delay = delay
+        self.lock = lock
+        self.on_reset = on_reset
+        self.cond = threading.Condition()
+        self.io_lock = threading.Lock()
+        self.replaces = {} # path -> (ma'lumot, keyin tozalanadigan jurnal)
+        self.appends = {}  # path -> [qatorlar]
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="PersistWriter", daemon=True)
+        self.thread.start()
+
+    def replace(self, path, data, reset=None):
+        with self.cond:
+            self.replaces[path] = (data, reset)
+            self.cond.notify()
+
+    def append(self, path, line):
+        with self.cond:
+            self.appends.setdefault(path, []).append(line)
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not (self.replaces or self.appends) and not self.closed:
+                    self.cond.wait()
+                if self.closed: return
+            time.sleep(self.delay) # Shu vaqt ichida kelgan saqlashlar ham shu yozuvga qo'shiladi
+            self.flush()
+
+    def flush(self):
+        with self.io_lock:
+            # Tartib muhim: avval jurnal qatorlari olinadi, keyin snapshot.
+            # Shunda olingan qatorlarning barchasi snapshotda bor va ularni tashlab yuborish xavfsiz.
+            with self.cond:
+                appends, self.appends = self.appends, {}
+                replaces, self.replaces = self.replaces, {}
+            if not (appends or replaces): return
+
+            if self.lock and not self.lock.acquire():
+                # Boshqa nusxa yozmoqda: hammasi navbatga qaytadi
+                logging.warning("Yozish qulfi band, keyinroq qayta urinib ko'riladi")
+                with self.cond:
+                    for path, lines in appends.items(): self.appends[path] = lines + self.appends.get(path, [])
+                    for path, item in replaces.items(): self.replaces.setdefault(path, item)
+                return
+            try:
+                self.write(appends, replaces)
+            finally:
+                if self.lock: self.lock.release()
+
+    def write(self, appends, replaces):
+        for path, (data, reset) in replaces.items():
+            try:
+                if reset and self.on_reset:
+                    if not self.on_reset(path, data, reset, appends.get(reset, [])):
+                        with self.cond: self.replaces.setdefault(path, (data, reset))
+                        continue
+                    appends.pop(reset, None)
+                    continue
+                text = json.dumps(snapshot_of(data), indent=4, ensure_ascii=False)
+                atomic_write(path, text)
+                if reset:
+                    appends.pop(reset, None)
+                    atomic_write(reset, "")
+            except Exception as e:
+                logging.error(f"Saqlash xatosi ({path}): {e}")
+                with self.cond: self.replaces.setdefault(path, (data, reset))
+
+        for path, lines in appends.items():
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                logging.error(f"Jurnal xatosi ({path}): {e}")
+                with self.cond: self.appends[path] = lines + self.appends.get(path, [])
+
+    def close(self):
+        # Navbat bo'shaguncha qayta urinadi: qulf band bo'lsa, u eskirib olib tashlanguncha kutiladi.
+        # Baribir yozilmaganlari tashlab yuborilmaydi - *.recovery-* fayllarga tushadi (ro'yxati qaytariladi)
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        deadline = time.monotonic() + (self.lock.stale if self.lock else 0) + 5
+        while True:
+            self.flush()
+            with self.cond:
+                if not (self.replaces or self.appends): return []
+            if time.monotonic() >= deadline: break
+            time.sleep(0.2)
+        with self.cond:
+            appends, self.appends = self.appends, {}
+            replaces, self.replaces = self.replaces, {}
+        return self.recover(appends, replaces)
+
+    def recover(self, appends, replaces):
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        saved = []
+        for path, lines in appends.items():
+            target = f"{path}.recovery-{stamp}"
+            try:
+                with open(target, "a", encoding="utf-8") as f: f.write("".join(lines))
+                saved.append(target)
+            except Exception as e:
+                logging.error(f"Jurnal qatorlari saqlanmadi ({target}): {e}")
+        for path, (data, reset) in replaces.items():
+            target = f"{path}.recovery-{stamp}"
+            try:
+                atomic_write(target, json.dumps(snapshot_of(data), indent=4, ensure_ascii=False))
+                saved.append(target)
+            except Exception as e:
+                logging.error(f"Snapshot saqlanmadi ({target}): {e}")
+        if saved: logging.error(f"Yopilishda yozib bo'lmadi, o'zgarishlar saqlandi: {saved}")
+        return saved
+
+NETWORK_FS_TYPES = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "afs"}
+
+def is_network_path(path):
+    # Fayl tarmoq papkasidami (UNC \\server\share, tarmoq diski yoki NFS/SMB mount)
+    full = os.path.realpath(os.path.abspath(path))
+    try:
+        if sys.platform == "win32":
+            if full.startswith("\\\\"): return True
+            import ctypes
+            return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(full)[0] + "\\") == 4 # DRIVE_REMOTE
+        best, fstype = "", ""
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3: continue
+                mnt = parts[1].replace("\\040", " ")
+                if (full == mnt or full.startswith(mnt.rstrip("/") + "/")) and len(mnt) > len(best): best, fstype = mnt, parts[2]
+        return fstype in NETWORK_FS_TYPES
+    except Exception:
+        return False
+
+class SQLiteStore:
+    # Tashkilotlar, chiqindi qutisi va faoliyat tarixi bitta SQLite faylda.
+    # Har bir tahrir bitta qatorli INSERT/UPDATE/DELETE, qidiruv indekslar orqali.
+    # Asosiy ustunlardan tashqari maydonlar (qo'shimcha ustunlar) "extra" da JSON ko'rinishida.
+    COLUMNS = ("uuid", "s", "m", "f", "t", "inn", "izoh")
+
+    def __init__(self, path=SQLITE_FILE, file_lock=None):
+        self.lock = threading.Lock() # Cloud sync fon oqimidan ham chaqirilishi mumkin
+        self.file_lock = file_lock # JSON rejimidagi kabi: yozishlar nusxalar orasida ham FileLock ostida
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        if is_network_path(path):
+            # WAL bitta kompyuterdagi umumiy xotirani talab qiladi, tarmoq papkasida xavfsiz emas
+            self.conn.execute("PRAGMA journal_mode=DELETE")
+            self.conn.execute("PRAGMA synchronous=FULL")
+        else:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+        cols = ", ".join(self.COLUMNS)
+        marks = ", ".join("?" * (len(self.COLUMNS) + 1))
+        self.sql_insert_org = f"INSERT INTO orgs ({cols}, extra) VALUES ({marks})"
+        self.sql_insert_trash = f"INSERT INTO trash ({cols}, extra, deleted_at) VALUES ({marks}, ?)"
+        self.sql_select = f"SELECT {cols}, extra"
+
+    @contextlib.contextmanager
+    def writing(self):
+        # Bitta yozish tranzaksiyasi: jarayon ichida self.lock, nusxalar orasida FileLock
+        with self.lock:
+            locked = self.file_lock.acquire() if self.file_lock else False
+            if self.file_lock and not locked: logging.warning("Yozish qulfi band: SQLite o'z qulfiga tayanadi")
+            try:
+                with self.conn: yield
+            finally:
+                if locked: self.file_lock.release()
+
+    def to_row(self, item, skip=()):
+        extra = {k: v for k, v in item.items() if k not in self.COLUMNS and k not in skip}
+        row = [str(item.get(c, "")) for c in self.COLUMNS]
+        row.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+        return row
+
+    def from_row(self, row):
+        item = dict(zip(self.COLUMNS, row[:len(self.COLUMNS)]))
+        extra = row[len(self.COLUMNS)]
+        if extra: item.update(json.loads(extra))
+        return item
+
+    # --- Tashkilotlar ---
+    def load_orgs(self):
+        with self.lock:
+            rows = self.conn.execute(f"{self.sql_select} FROM orgs ORDER BY pos").fetchall()
+        return [self.from_row(r) for r in rows]
+
+    def apply_op(self, op):
+        # DataManager amalini (add/set/del) bitta qatorli SQL ga aylantirish
+        kind = op.get("op")
+        with self.writing():
+            if kind == "add":
+                self.conn.execute(self.sql_insert_org, self.to_row(op["item"]))
+            elif kind == "set":
+                u = op["uuid"]
+                fields = op.get("fields", {})
+                unset = op.get("unset", [])
+                base = {k: str(v) for k, v in fields.items() if k in self.COLUMNS and k != "uuid"}
+                base.update({k: "" for k in unset if k in self.COLUMNS and k != "uuid"})
+                if base:
+                    sets = ", ".join(f"{k} = ?" for k in base)
+                    self.conn.execute(f"UPDATE orgs SET {sets} WHERE uuid = ?", [*base.values(), u])
+                extra_set = {k: v for k, v in fields.items() if k not in self.COLUMNS}
+                extra_unset = [k for k in unset if k not in self.COLUMNS]
+                if extra_set or extra_unset:
+                    row = self.conn.execute("SELECT extra FROM orgs WHERE uuid = ?", (u,)).fetchone()
+                    extra = json.loads(row[0]) if row and row[0] else {}
+                    extra.update(extra_set)
+                    for k in extra_unset: extra.pop(k, None)
+                    self.conn.execute("UPDATE orgs SET extra = ? WHERE uuid = ?",
+                                      (json.dumps(extra, ensure_ascii=False) if extra else None, u))
+            elif kind == "del":
+                self.conn.execute("DELETE FROM orgs WHERE uuid = ?", (op["uuid"],))
+            self.log_change(op)
+
+    def replace_orgs(self, items, src=None):
+        # Ommaviy amallar uchun (ustun nomini o'zgartirish, bulutdan yuklash)
+        with self.writing():
+            self.conn.execute("DELETE FROM orgs")
+            self.conn.executemany(self.sql_insert_org, [self.to_row(i) for i in items])
+            self.log_change({"op": "reload", "src": src}) # Boshqa nusxalar to'liq solishtiradi
+
+    # --- Boshqa nusxalar uchun o'zgarishlar jurnali ---
+    def log_change(self, op):
+        # Tranzaksiya ichida chaqiriladi; oxirgi 5000 ta amal saqlanadi
+        cur = self.conn.execute("INSERT INTO changes (src, op) VALUES (?, ?)",
+                                (op.get("src"), json.dumps(op, ensure_ascii=False, separators=(",", ":"))))
+        if cur.lastrowid % 500 == 0:
+            self.conn.execute("DELETE FROM changes WHERE seq <= ?", (cur.lastrowid - 5000,))
+
+    def last_change(self):
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def changes_since(self, seq):
+        # [(seq, amal)]; None - kerakli amallar allaqachon o'chirilgan, to'liq solishtirish kerak
+        with self.lock:
+            first = self.conn.execute("SELECT MIN(seq) FROM changes").fetchone()[0]
+            rows = self.conn.execute("SELECT seq, op FROM changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+        if first is not None and first > seq + 1 and seq: return None
+        return [(n, json.loads(op)) for n, op in rows]
+
+    # --- Chiqindi qutisi ---
+    def load_trash(self):
+        with self.lock:
+            rows = self.conn.execute(f"{self.sql_select}, deleted_at FROM trash ORDER BY pos").fetchall()
+        items = []
+        for r in rows:
+            item = self.from_row(r[:-1])
+            if r[-1]: item["deleted_at"] = r[-1]
+            items.append(item)
+        return items
+
+    def insert_trash(self, item):
+        with self.writing():
+            self.conn.execute(self.sql_insert_trash, self.to_row(item, skip=("deleted_at",)) + [item.get("deleted_at")])
+
+    def delete_trash_many(self, uuids):
+        with self.writing():
+            self.conn.executemany("DELETE FROM trash WHERE uuid = ?", [(u,) for u in uuids])
+
+    # --- Faoliyat tarixi ---
+    def load_log(self, limit=1000):
+        with self.lock:
+            rows = self.conn.execute("SELECT time, user, action, details FROM activity_log ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [dict(zip(("time", "user", "action", "details"), r)) for r in rows]
+
+    def insert_log(self, entry):
+        with self.writing():
+            self.conn.execute("INSERT INTO activity_log (time, user, action, details) VALUES (?, ?, ?, ?)",
+                              (entry["time"], entry["user"], entry["action"], entry["details"]))
+            self.conn.execute("DELETE FROM activity_log WHERE id <= (SELECT MAX(id) FROM activity_log) - 1000")
+
+    def import_json(self, data, trash, log):
+        # Bir martalik import: mahalla_bazasi.json / trash.json / activity_log.json
+        with self.writing():
+            self.conn.execute("DELETE FROM orgs")
+            self.conn.execute("DELETE FROM trash")
+            self.conn.execute("DELETE FROM activity_log")
+            self.conn.executemany(self.sql_insert_org, [self.to_row(i) for i in data])
+            self.conn.executemany(self.sql_insert_trash,
+                                  [self.to_row(i, skip=("deleted_at",)) + [i.get("deleted_at")] for i in trash])
+            # Tarix yangidan eskiga saqlangan, jadvalga eskidan yangiga yozamiz
+            self.conn.executemany("INSERT INTO activity_log (time, user, action, details) VALUES (?, ?, ?, ?)",
+                                  [(e.get("time"), e.get("user"), e.get("action"), e.get("details")) for e in reversed(log)])
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def get_schema_version(self):
+        # PRAGMA user_version: 0 - versiyasiz (sxema 1 bilan teng)
+        with self.lock:
+            return max(1, self.conn.execute("PRAGMA user_version").fetchone()[0])
+
+    def set_schema_version(self, version):
+        with self.writing():
+            self.conn.execute(f"PRAGMA user_version = {int(version)}")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def record_key(rec):
+    # UUID bo'lmagan (eski) yozuvlar uchun ikkilamchi kalit
+    return f"{canonical_category(rec.get('s'))}|{rec.get('m', '')}|{normalize_inn(rec.get('inn'))}"
+
+def field_diff(old, new):
+    # {maydon: (eski, yangi)}; eski nusxada uuid bo'lmasa, uuid farq hisoblanmaydi
+    if old == new: return {}
+    diff = {k: (v, new.get(k)) for k, v in old.items() if new.get(k) != v}
+    for k in new.keys() - old.keys():
+        if new[k] is not None: diff[k] = (None, new[k])
+    if not old.get("uuid"): diff.pop("uuid", None)
+    return diff
+
+def journal_epoch_of(raw):
+    # Jurnal sarlavhasi {"epoch": ...}; sarlavhasiz (eski) jurnal uchun ""
+    line = raw.split(b"\n", 1)[0]
+    if not line.startswith(b'{"epoch"'): return ""
+    try:
+        return json.loads(line).get("epoch", "")
+    except ValueError:
+        return ""
+
+def parse_journal(raw):
+    # Jurnal baytlaridan amallar (sarlavha va buzilgan qatorlar o'tkazib yuboriladi)
+    for line in raw.decode("utf-8", errors="replace").splitlines():
+        line = line.strip()
+        if not line: continue
+        try:
+            op = json.loads(line)
+        except ValueError:
+            # Yozish paytida uzilib qolgan qator
+            logging.warning("Jurnal: buzilgan qator o'tkazib yuborildi")
+            continue
+        if "op" in op: yield op
+
+def op_keys(op):
+    # Amal tegadigan (uuid, maydon) juftlari; qo'shish/o'chirish butun yozuvga (maydon=None)
+    u = op.get("uuid") or op.get("item", {}).get("uuid")
+    if op.get("op") != "set": return [(u, None)]
+    return [(u, k) for k in (*op.get("fields", {}), *op.get("unset", []))]
+
+def remote_ops(ops, src):
+    # Boshqa nusxalar amallari. Jurnalda ulardan keyin o'zimiz yozgan maydonlar olib tashlanadi:
+    # diskda bizning qiymat oxirgi, xotirada ham shunday qolishi kerak.
+    later, out = set(), []
+    for op in reversed(ops):
+        keys = op_keys(op)
+        if op.get("src") == src:
+            later.update(keys)
+            continue
+        u = keys[0][0] if keys else op.get("uuid")
+        if (u, None) in later: continue
+        if op.get("op") == "set":
+            fields = {k: v for k, v in op.get("fields", {}).items() if (u, k) not in later}
+            unset = [k for k in op.get("unset", []) if (u, k) not in later]
+            if not fields and not unset: continue
+            op = {**op, "fields": fields, "unset": unset}
+        out.append(op)
+    out.reverse()
+    return out
+
+def ops_between(old, new):
+    # Ikki holat orasidagi farq amallar ko'rinishida (uuid bo'yicha)
+    old_map = {i.get("uuid"): i for i in old}
+    ops = []
+    for rec in new:
+        u = rec.get("uuid")
+        o = old_map.pop(u, None)
+        if o is None:
+            ops.append({"op": "add", "item": rec})
+        elif o != rec:
+            fields = {k: v for k, v in rec.items() if k not in o or o[k] != v}
+            ops.append({"op": "set", "uuid": u, "fields": fields, "unset": [k for k in o if k not in rec]})
+    ops.extend({"op": "del", "uuid": u} for u in old_map)
+    return ops
+
+class BackupStore:
+    # Kontent-manzilli zaxira. Yozuvlar bo'laklarga bo'linadi, har bo'lak zlib bilan siqilib,
+    # xeshi bo'yicha bir marta saqlanadi. Snapshot - faqat bo'lak xeshlari ro'yxati (manifest),
+    # shuning uchun yuzlab snapshot bittasidan sal ko'proq joy egallaydi.
+    CHUNK_AVG = 32   # O'rtacha bo'lak hajmi (yozuv)
+    CHUNK_MAX = 128
+
+    def __init__(self, root=BACKUP_DIR):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.snaps_dir = os.path.join(root, "snapshots")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snaps_dir, exist_ok=True)
+
+    def chunk(self, data):
+        # Chegara yozuv xeshiga qarab tanlanadi (content-defined chunking):
+        # yozuv qo'shilsa yoki o'chirilsa, faqat o'sha bo'lak o'zgaradi, qolganlari qayta ishlatiladi.
+        # Natija: [(bo'lak matni, bo'lakdagi yozuvlar)]
+        chunks, cur, recs = [], [], []
+        encode = json.JSONEncoder(ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode
+        for rec in data:
+            line = encode(rec)
+            cur.append(line)
+            recs.append(rec)
+            h = hashlib.blake2b(line.encode("utf-8"), digest_size=4).digest()
+            if int.from_bytes(h, "big") % self.CHUNK_AVG == 0 or len(cur) >= self.CHUNK_MAX:
+                chunks.append(("[" + ",".join(cur) + "]", recs))
+                cur, recs = [], []
+        if cur: chunks.append(("[" + ",".join(cur) + "]", recs))
+        return chunks
+
+    def object_path(self, h):
+        return os.path.join(self.objects_dir, h[:2], h)
+
+    def put(self, content):
+        raw = content.encode("utf-8")
+        h = hashlib.blake2b(raw, digest_size=16).hexdigest()
+        path = self.object_path(h)
+        try:
+            os.utime(path) # Bir xil bo'lak faqat bir marta yoziladi; qayta ishlatilgani "yangi" (GC tegmaydi)
+        except OSError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f: f.write(zlib.compress(raw, 6))
+            os.replace(tmp, path)
+        return h
+
+    def get(self, h):
+        with open(self.object_path(h), "rb") as f:
+            return json.loads(zlib.decompress(f.read()).decode("utf-8"))
+
+    def list_snapshots(self):
+        # [(nomi, vaqt)] - yangidan eskiga
+        snaps = []
+        for name in os.listdir(self.snaps_dir):
+            if not (name.startswith("snap_") and name.endswith(".json")): continue
+            try: ts = time.mktime(time.strptime(name[5:20], "%Y%m%d_%H%M%S"))
+            except ValueError: continue
+            snaps.append((name, ts))
+        snaps.sort(key=lambda x: x[0], reverse=True)
+        return snaps
+
+    def read_manifest(self, name):
+        with open(os.path.join(self.snaps_dir, name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def list_legacy(self):
+        # Eski usuldagi to'liq nusxalar (backup_*.json), yangidan eskiga
+        return sorted((n for n in os.listdir(self.root) if n.startswith("backup_") and n.endswith(".json")), reverse=True)
+
+    def load(self, name):
+        if name.startswith("backup_"):
+            with open(os.path.join(self.root, name), "r", encoding="utf-8") as f:
+                return unwrap_db(json.load(f))[1]
+        records = []
+        for h in self.read_manifest(name)["chunks"]:
+            records.extend(self.get(h))
+        return records
+
+    def chunk_index(self, source, live):
+        # {bo'lak xeshi: yozuvlar yoki None}. None - bo'lak omborda, faqat kerak bo'lsa o'qiladi.
+        # source=None - joriy (jonli) ma'lumot
+        if source is None or source.startswith("backup_"):
+            records = live if source is None else self.load(source)
+            return {hashlib.blake2b(c.encode("utf-8"), digest_size=16).hexdigest(): recs for c, recs in self.chunk(records)}
+        return {h: None for h in self.read_manifest(source)["chunks"]}
+
+    def diff(self, old, new, live=None):
+        # Yozuv darajasidagi farq, uuid bo'yicha chiziqli hash join.
+        # Ikkala tomonda bir xil bo'laklar umuman ochilmaydi - faqat o'zgargan bo'laklar solishtiriladi.
+        a = self.chunk_index(old, live)
+        b = self.chunk_index(new, live)
+        
+        def records(idx, hashes):
+            for h in hashes:
+                recs = idx[h]
+                yield from (recs if recs is not None else self.get(h))
+        
+        old_map, old_loose = {}, {}
+        for r in records(a, a.keys() - b.keys()):
+            if r.get("uuid"): old_map[r["uuid"]] = r
+            else: old_loose[record_key(r)] = r # UUID siz eski yozuvlar
+        new_map = {}
+        for r in records(b, b.keys() - a.keys()):
+            new_map[r.get("uuid") or record_key(r)] = r
+        
+        added, removed, changed = [], [], []
+        matched = set()
+        for k, r in old_map.items():
+            n = new_map.get(k)
+            if n is None:
+                removed.append(r)
+                continue
+            matched.add(k)
+            fields = field_diff(r, n)
+            if fields: changed.append((r, n, fields))
+        
+        # UUID siz eski yozuvlar yangi tomonda (s, m, inn) bo'yicha topiladi
+        if old_loose:
+            by_key = {record_key(n): k for k, n in new_map.items() if k not in matched}
+            for k, r in old_loose.items():
+                nk = by_key.get(k)
+                if nk is None:
+                    removed.append(r)
+                    continue
+                matched.add(nk)
+                fields = field_diff(r, new_map[nk])
+                if fields: changed.append((r, new_map[nk], fields))
+        
+        for k, n in new_map.items():
+            if k not in matched: added.append(n)
+        return {"added": added, "removed": removed, "changed": changed}
+
+    def snapshot(self, data, now=None):
+        now = now or time.time()
+        hashes = [self.put(c) for c, _ in self.chunk(data)]
+        
+        snaps = self.list_snapshots()
+        if snaps and self.read_manifest(snaps[0][0])["chunks"] == hashes:
+            return None # O'zgarish yo'q - yangi manifest shart emas
+        
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(now))
+        name = f"snap_{stamp}.json"
+        n = 1
+        while os.path.exists(os.path.join(self.snaps_dir, name)):
+            name = f"snap_{stamp}_{n}.json"
+            n += 1
+        manifest = {"time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)), "count": len(data), "chunks": hashes}
+        atomic_write(os.path.join(self.snaps_dir, name), json.dumps(manifest))
+        self.prune(now)
+        return name
+
+    def prune(self, now=None):
+        # Vaqtga asoslangan saqlash: soatlik / kunlik / oylik, har davrdan eng yangisi qoladi
+        now = now or time.time()
+        seen, keep, removed = set(), [], False
+        for name, ts in self.list_snapshots():
+            age = now - ts
+            lt = time.localtime(ts)
+            if age < BACKUP_KEEP_HOURS * 3600: bucket = time.strftime("h%Y%m%d%H", lt)
+            elif age < BACKUP_KEEP_DAYS * 86400: bucket = time.strftime("d%Y%m%d", lt)
+            else: bucket = time.strftime("m%Y%m", lt)
+            if bucket in seen:
+                os.remove(os.path.join(self.snaps_dir, name))
+                removed = True
+            else:
+                seen.add(bucket)
+                keep.append(name)
+        if removed: self.collect_garbage(keep)
+
+    def collect_garbage(self, keep):
+        # Hech bir manifestda qolmagan bo'laklarni o'chirish. Yaqinda yozilgan/ishlatilgan bo'laklar va .tmp lar
+        # qoladi: boshqa nusxa ularni yozib, manifestini hali saqlamagan bo'lishi mumkin
+        live = set()
+        for name in keep: live.update(self.read_manifest(name)["chunks"])
+        cutoff = time.time() - BACKUP_GC_GRACE_SECONDS
+        for sub in os.listdir(self.objects_dir):
+            sub_dir = os.path.join(self.objects_dir, sub)
+            for h in os.listdir(sub_dir):
+                if h in live: continue
+                path = os.path.join(sub_dir, h)
+                try:
+                    if os.path.getmtime(path) < cutoff: os.remove(path)
+                except OSError: pass # Boshqa nusxa allaqachon o'chirgan/almashtirgan
+
+def file_signature(*paths):
+    # Kesh kaliti: fayllarning o'zgarish vaqti va hajmi (fayl yo'q bo'lsa None)
+    sig = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            sig.append([p, st.st_mtime_ns, st.st_size])
+        except OSError:
+            sig.append([p, None, None])
+    return sig
+
+class DerivedCache:
+    # Har yozuv uchun oldindan hisoblangan qiymatlar: (nomi, F.I.SH, izoh qidiruv kaliti - search_key,
+    # telefon +998XXXXXXXXX ko'rinishida - canonical_phone, kategoriya kaliti, INN kaliti)
+    # va kategoriya sonlari. Qo'shimcha ustunlar kalitlari ham yozuv bo'yicha eslab qolinadi (faqat xotirada). Yopilishda diskka yoziladi, baza fayli o'zgarmagan bo'lsa keyingi
+    # ishga tushishda qayta hisoblanmaydi. Tahrirlar yozuvni keshdan chiqaradi, kerak bo'lganda qayta hisoblanadi.
+    VERSION = 5 # 5: INN kaliti qo'shildi
+    SLOTS = {"m": 0, "f": 1, "izoh": 2, "s": 4, "inn": 5} # Maydon -> entry dagi o'rni (telefon - 3, alohida)
+
+    def __init__(self, path=DERIVED_CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {} # {uuid: (m, f, izoh, t_e164, s, inn)}
+        self.fields = {} # {uuid: {maydon: kalit}} - qo'shimcha ustunlar, diskka yozilmaydi
+        self.counts = None # Counter({kategoriya: soni})
+        self.gen = 0 # Har tahrirda oshadi: fonda qurilgan eski natija o'rnatilmaydi
+
+    @staticmethod
+    def compute(item):
+        return (search_key(item.get("m", "")), search_key(item.get("f", "")), search_key(item.get("izoh", "")),
+                canonical_phone(item.get("t", "")), search_key(item.get("s", "")), search_key(item.get("inn", "")))
+
+    def entry(self, item):
+        e = self.entries.get(item.get("uuid"))
+        if e is None:
+            e = self.entries[item.get("uuid")] = self.compute(item)
+        return e
+
+    def key(self, item, field):
+        # Maydonning qidiruv kaliti: asosiylari entry dan, qolganlari birinchi so'rovda hisoblanib eslab qolinadi
+        slot = self.SLOTS.get(field)
+        if slot is not None: return self.entry(item)[slot]
+        keys = self.fields.get(item.get("uuid"))
+        if keys is None: keys = self.fields[item.get("uuid")] = {}
+        k = keys.get(field)
+        if k is None: k = keys[field] = search_key(item.get(field, ""))
+        return k
+
+    def category_counts(self, data):
+        counts = self.counts
+        if counts is None:
+            counts = self.counts = collections.Counter(i.get("s") for i in data)
+        return counts
+
+    def forget(self, item, sign=0):
+        # Yozuv o'zgardi (sign=0), qo'shildi (+1) yoki o'chirildi (-1)
+        with self.lock:
+            self.gen += 1
+            self.entries.pop(item.get("uuid"), None)
+            self.fields.pop(item.get("uuid"), None)
+            if sign and self.counts is not None: self.counts[item.get("s")] += sign
+
+    def move_category(self, old, new):
+        with self.lock:
+            if self.counts is not None:
+                self.counts[old] -= 1
+                self.counts[new] += 1
+
+    def reset(self):
+        # Ommaviy o'zgarish: hammasi qaytadan hisoblanadi
+        with self.lock:
+            self.gen += 1
+            self.entries = {}
+            self.fields = {}
+            self.counts = None
+
+    def load(self, sig):
+        # Kesh faqat bazaning aynan shu holati uchun yozilgan bo'lsa qabul qilinadi
+        if not os.path.exists(self.path): return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                obj = json.load(f)
+        except Exception as e:
+            logging.warning(f"Kesh o'qilmadi: {e}")
+            return False
+        if obj.get("version") != self.VERSION or obj.get("schema_version") != SCHEMA_VERSION or obj.get("source") != sig:
+            return False
+        with self.lock:
+            self.entries = {u: tuple(e) for u, e in obj.get("records", {}).items()}
+            self.counts = collections.Counter(obj.get("counts", {}))
+        return True
+
+    def build(self, data):
+        # Fon oqimida: hamma yozuvlarni hisoblash. Shu payt tahrir bo'lsa natija tashlanadi.
+        gen = self.gen
+        items = list(data)
+        built = {i.get("uuid"): self.compute(i) for i in items}
+        counts = collections.Counter(i.get("s") for i in items)
+        with self.lock:
+            if gen != self.gen: return False
+            for u, e in built.items(): self.entries.setdefault(u, e)
+            if self.counts is None: self.counts = counts
+        return True
+
+    def save(self, sig, data):
+        records = {i.get("uuid"): self.entry(i) for i in data} # O'chirilganlar tushib qoladi
+        obj = {"version": self.VERSION, "schema_version": SCHEMA_VERSION, "source": sig,
+               "counts": self.category_counts(data), "records": records}
+        atomic_write(self.path, json.dumps(obj, ensure_ascii=False, separators=(",", ":")))
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def word_tokens(text):
+    return set(re.findall(r"\w{2,}", text))
+
+def fuzzy_limit(word):
+    # Qisqa so'zda 2 ta xato - deyarli har narsa mos: 1 ta
+    return 1 if len(word) <= 5 else 2
+
+def deletions(word, depth):
+    # SymSpell: so'z boshidan (FUZZY_PREFIX) 0..depth ta harf o'chirilgan barcha variantlar
+    word = word[:FUZZY_PREFIX]
+    result, level = {word}, {word}
+    for _ in range(depth):
+        level = {w[:i] + w[i + 1:] for w in level for i in range(len(w))}
+        result |= level
+    return result
+
+def edit_distance(a, b, limit):
+    # Damerau-Levenshtein (qo'shni harflar almashinuvi = 1 xato); limit dan oshsa limit + 1.
+    # Faqat diagonal atrofidagi (|i - j| <= limit) kataklar hisoblanadi
+    if abs(len(a) - len(b)) > limit: return limit + 1
+    if a == b: return 0
+    big = limit + 1
+    prev2, prev = None, [j if j <= limit else big for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        cur = [big] * (len(b) + 1)
+        if i <= limit: cur[0] = i
+        row_min, ai = cur[0], a[i - 1]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            bj = b[j - 1]
+            v = prev[j - 1] + (ai != bj)
+            if prev[j] + 1 < v: v = prev[j] + 1
+            if cur[j - 1] + 1 < v: v = cur[j - 1] + 1
+            if i > 1 and j > 1 and ai == b[j - 2] and a[i - 2] == bj and prev2[j - 2] + 1 < v: v = prev2[j - 2] + 1
+            cur[j] = v if v < big else big
+            if v < row_min: row_min = v
+        if row_min > limit: return big
+        prev2, prev = prev, cur
+    return prev[-1]
+
+class SearchIndex:
+    # Qidiruv uchun trigram indeksi: {maydon: {trigram: array(yozuv raqamlari)}}.
+    # Yozuv raqami (rid) qo'shilish tartibida beriladi, shuning uchun rid bo'yicha saralash = jadval tartibi.
+    # Ro'yxatlar faqat to'ldiriladi: tahrirdan keyin eski trigramlar qoladi, lekin har nomzod haqiqiy
+    # matn bilan tekshiriladi. Eskirganlar ko'payib ketsa (stale), indeks fonda qayta quriladi.
     def __init__(self):
-        self.data = self.load_json(DB_FILE)
-        self.trash = self.load_json(TRASH_FILE)
-        self.categories = self.load_json("categories.json")
-        self.activity_log = self.load_json(LOG_FILE)
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.keys = {} # {maydon: {rid: search_key}} - nomzodlarni tekshirish uchun
+        self.words = {} # FUZZY_FIELDS: {maydon: {so'z: set(rid)}}
+        self.deletes = {} # {maydon: {o'chirilgan variant: set(so'z)}}
+        self.phones = {} # {telefonning oxirgi 4..9 raqami: set(rid)}
+        self.cats = {} # {kategoriya: array(rid)} - kategoriya o'zgarsa eski ro'yxatda qoladi (tekshiriladi)
+        self.rid_of = {} # uuid -> rid
+        self.items = {}  # rid -> yozuv
+        self.next_rid = 0
+        self.stale = 0
+        self.ready = False
+        self.gen = 0
+
+    def index(self, rid, item, fields):
+        for f in fields:
+            post = self.postings.setdefault(f, {})
+            keys = self.keys.setdefault(f, {})
+            if f == "t":
+                # Telefon: trigram emas, teskari (oxirgi raqamlar) indeks
+                old, keys[rid] = keys.get(rid), canonical_phone(item.get(f, ""))
+                self.index_phone(rid, old, keys[rid])
+                continue
+            old, key = keys.get(rid), search_key(item.get(f, ""))
+            keys[rid] = key
+            if f in FUZZY_FIELDS: self.index_words(f, rid, old, key)
+            for g in trigrams(key):
+                p = post.get(g)
+                if p is None: p = post[g] = array.array("i")
+                p.append(rid)
+
+    def index_phone(self, rid, old, canon):
+        for k in phone_suffixes(old) - phone_suffixes(canon) if old else ():
+            rids = self.phones.get(k)
+            if rids: rids.discard(rid)
+        for k in phone_suffixes(canon): self.phones.setdefault(k, set()).add(rid)
+
+    def index_category(self, rid, item):
+        rids = self.cats.get(item.get("s"))
+        if rids is None: rids = self.cats[item.get("s")] = array.array("i")
+        rids.append(rid)
+
+    def index_words(self, field, rid, old, key):
+        words = self.words.setdefault(field, {})
+        new = word_tokens(key)
+        if old:
+            for w in word_tokens(old) - new:
+                rids = words.get(w)
+                if rids: rids.discard(rid)
+        deletes = self.deletes.setdefault(field, {})
+        for w in new:
+            rids = words.get(w)
+            if rids is None:
+                rids = words[w] = set()
+                for d in deletions(w, 2): deletes.setdefault(d, set()).add(w)
+            rids.add(rid)
+
+    def build(self, data, fields):
+        # Fon oqimida; shu payt tahrir bo'lsa natija tashlanadi (False), qayta qurish kerak
+        with self.lock: gen = self.gen
+        fresh = SearchIndex()
+        for item in list(data):
+            rid = fresh.next_rid
+            fresh.next_rid += 1
+            fresh.rid_of[item.get("uuid")] = rid
+            fresh.items[rid] = item
+            fresh.index(rid, item, fields)
+            fresh.index_category(rid, item)
+        for f in fields:
+            fresh.postings.setdefault(f, {})
+            fresh.keys.setdefault(f, {})
+        with self.lock:
+            if gen != self.gen: return False
+            self.postings, self.keys, self.rid_of, self.items = fresh.postings, fresh.keys, fresh.rid_of, fresh.items
+            self.words, self.deletes, self.cats, self.phones = fresh.words, fresh.deletes, fresh.cats, fresh.phones
+            self.next_rid, self.stale, self.ready = fresh.next_rid, 0, True
+        return True
+
+    def add(self, item):
+        with self.lock:
+            self.gen += 1
+            if not self.ready: return
+            rid = self.next_rid
+            self.next_rid += 1
+            self.rid_of[item.get("uuid")] = rid
+            self.items[rid] = item
+            self.index(rid, item, list(self.postings))
+            self.index_category(rid, item)
+
+    def update(self, item, fields):
+        with self.lock:
+            self.gen += 1
+            rid = self.rid_of.get(item.get("uuid"))
+            if not self.ready or rid is None: return
+            self.index(rid, item, [f for f in fields if f in self.postings])
+            if "s" in fields: self.index_category(rid, item)
+            self.stale += 1
+
+    def remove(self, item):
+        with self.lock:
+            self.gen += 1
+            rid = self.rid_of.pop(item.get("uuid"), None)
+            if rid is not None:
+                self.items.pop(rid, None)
+                for f, keys in self.keys.items():
+                    old = keys.pop(rid, None)
+                    if old and f == "t": self.index_phone(rid, old, "")
+                    if old and f in self.words:
+                        for w in word_tokens(old): self.words[f].get(w, set()).discard(rid)
+                self.stale += 1
+
+    def needs_rebuild(self):
+        return self.ready and self.stale > max(1000, len(self.items) // 2)
+
+    def search(self, q, field):
+        # q - search_key ko'rinishida. Mos yozuvlar jadval tartibida; None - indeks tayyor emas
+        # yoki so'rov juda qisqa (oddiy qidiruv)
+        if field == "t": return self.phone(q)
+        if not self.ready or len(q) < 3 or field not in self.postings: return None
+        post = self.postings[field]
+        lists = []
+        for g in trigrams(q):
+            p = post.get(g)
+            if p is None: return []
+            lists.append(p)
+        lists.sort(key=len)
+        # Juda keng tarqalgan so'rovda indeks yutuq bermaydi: oddiy qidiruv tezroq
+        if len(lists[0]) > len(self.items) // 8: return None
+        cand = set(lists[0])
+        for p in lists[1:]:
+            # Katta ro'yxatni kesishtirgandan ko'ra nomzodlarni to'g'ridan-to'g'ri tekshirish arzonroq
+            if len(cand) < 32 or len(p) > 8 * len(cand): break
+            cand.intersection_update(p)
+        # Qidiruv fon oqimida: shu payt o'chirilgan yozuv tashlab ketiladi
+        items, keys = self.items, self.keys[field]
+        found = (items.get(r) for r in sorted(cand) if q in keys.get(r, ""))
+        return [i for i in found if i is not None]
+
+    def phone(self, q):
+        # Raqam(ning oxiri) bo'yicha yozuvlar jadval tartibida; None - indeks tayyor emas yoki raqam qisqa
+        digits = phone_query(q)
+        if not self.ready or len(digits) < PHONE_SUFFIX_MIN or "t" not in self.keys: return None
+        with self.lock: rids = sorted(self.phones.get(digits, ()))
+        items = self.items
+        return [items[r] for r in rids if r in items]
+
+    def category(self, cat):
+        # Shu kategoriyadagi yozuvlar jadval tartibida; None - indeks tayyor emas
+        return self.categories({cat})
+
+    def categories(self, cats):
+        # Bir nechta kategoriya yozuvlari (jadval tartibida, birlashtirilgan); None - indeks tayyor emas
+        if not self.ready: return None
+        rids = set()
+        for cat in cats: rids.update(self.cats.get(cat, ()))
+        items = self.items
+        found = (items.get(r) for r in sorted(rids))
+        return [i for i in found if i is not None and i.get("s") in cats]
+
+    def fuzzy(self, q, field):
+        # Xatoga chidamli qidiruv: har so'rov so'zi yozuvdagi biror so'zdan fuzzy_limit tagacha farq qilishi mumkin.
+        # -> [(jami farq, yozuv)] farq va jadval tartibida; None - indeks tayyor emas
+        if not self.ready or field not in self.words: return None
+        words, deletes = self.words[field], self.deletes[field]
+        scores = None
+        with self.lock: # Tahrir paytida to'plamlar o'zgarmasligi uchun
+            for qw in word_tokens(q):
+                limit = fuzzy_limit(qw)
+                best = {} # rid -> shu so'z uchun eng kichik farq
+                cands = set()
+                for d in deletions(qw, limit): cands |= deletes.get(d, set())
+                for w in cands:
+                    if abs(len(w) - len(qw)) > limit: continue # O'chirishlar faqat so'z boshidan: uzunlik farqi tekshirilmagan
+                    dist = edit_distance(qw, w, limit)
+                    if dist > limit: continue
+                    for rid in words.get(w, ()):
+                        if dist < best.get(rid, limit + 1): best[rid] = dist
+                if scores is None: scores = best
+                else: scores = {rid: scores[rid] + d for rid, d in best.items() if rid in scores}
+                if not scores: return []
+            items = self.items
+            found = sorted((d, rid) for rid, d in (scores or {}).items() if rid in items)
+            return [(d, items[rid]) for d, rid in found]
+
+class CompletionIndex:
+    # Formadagi avto-to'ldirish: har maydon uchun mavjud qiymatlar search_key bo'yicha saralangan ro'yxatda
+    # [(kalit, qiymat)], prefiks bisect bilan topiladi. Counter - qiymat nechta yozuvda (0 bo'lsa ro'yxatdan chiqadi).
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {} # {maydon: Counter(qiymat)}
+        self.sorted = {} # {maydon: [(search_key, qiymat)]}
+        self.gen = 0
+
+    def build(self, data, fields):
+        with self.lock: gen = self.gen
+        counts = {f: collections.Counter() for f in fields}
+        for item in list(data):
+            for f in fields:
+                v = str(item.get(f, "")).strip()
+                if v: counts[f][v] += 1
+        ordered = {f: sorted((search_key(v), v) for v in c) for f, c in counts.items()}
+        with self.lock:
+            if gen != self.gen: return False
+            self.counts, self.sorted = counts, ordered
+        return True
+
+    def count(self, item, sign, fields=None):
+        # Yozuv qiymatlarini qo'shish (+1) yoki chiqarish (-1); fields - faqat shu maydonlar
+        with self.lock:
+            self.gen += 1
+            for f in self.counts if fields is None else fields:
+                c = self.counts.get(f)
+                v = str(item.get(f, "")).strip()
+                if c is None or not v: continue
+                c[v] += sign
+                ordered, entry = self.sorted[f], (search_key(v), v)
+                if sign > 0 and c[v] == 1: bisect.insort(ordered, entry)
+                elif c[v] <= 0:
+                    del c[v]
+                    k = bisect.bisect_left(ordered, entry)
+                    if k < len(ordered) and ordered[k] == entry: del ordered[k]
+
+    def suggest(self, field, text, limit=COMPLETION_LIMIT):
+        # Shu bilan boshlanadigan qiymatlar, ko'p ishlatilgani birinchi
+        key = search_key(text).strip()
+        if not key: return []
+        with self.lock:
+            ordered, counts = self.sorted.get(field, []), self.counts.get(field, {})
+            start = bisect.bisect_left(ordered, (key,))
+            found = []
+            for k, v in ordered[start:start + limit * 8]:
+                if not k.startswith(key): break
+                found.append((-counts.get(v, 0), k, v))
+        return [v for _, k, v in sorted(found)[:limit] if v != text]
+
+class FilterCache:
+    # Jadval filtri natijalari: (so'rov, kategoriya, maydon) -> yozuvlar ro'yxati, eng eskisi chiqariladi.
+    # Ma'lumot versiyasi o'zgarsa (har qanday tahrir) kesh butunlay tozalanadi.
+    def __init__(self, size=FILTER_CACHE_SIZE):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+
+    def check(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, q, cat, tp, version):
+        with self.lock:
+            self.check(version)
+            hit = self.entries.get((q, cat, tp))
+            if hit is None: return None
+            self.entries.move_to_end((q, cat, tp))
+            return hit[0]
+
+    def base(self, q, cat, tp, version):
+        # Toraytirish uchun eng yaqin natija: so'rovning eng uzun keshlangan prefiksi
+        # (shu kategoriyada yoki "Barchasi" da) -> (prefiks, kategoriya, ro'yxat) yoki None
+        with self.lock:
+            self.check(version)
+            for k in range(len(q), -1, -1):
+                for c in (cat, "Barchasi"):
+                    hit = self.entries.get((q[:k], c, tp))
+                    if hit is not None and hit[1] and (k < len(q) or c != cat):
+                        self.entries.move_to_end((q[:k], c, tp))
+                        return q[:k], c, hit[0]
+            return None
+
+    def put(self, q, cat, tp, version, res, refine=True):
+        # refine=False - maydonli so'rov natijasi: uning prefiksi toraytirish uchun asos bo'la olmaydi
+        with self.lock:
+            if version != self.version: return
+            self.entries[(q, cat, tp)] = (res, refine)
+            self.entries.move_to_end((q, cat, tp))
+            while len(self.entries) > self.size: self.entries.popitem(last=False)
+
+class DataManager:
+    def __init__(self, load=True):
+        # Umumiy papkada bir nechta operator: yozishlar qulf ostida, jurnal tozalanishi write_snapshot orqali
+        self.file_lock = FileLock(LOCK_FILE)
+        self.writer = PersistWriter(lock=self.file_lock, on_reset=self.write_snapshot)
         self.settings = self.load_json(SETTINGS_FILE)
+        self.categories = self.load_json("categories.json")
         
         # Standart Sozlamalar
         if not self.settings:
@@ -57,6 +1407,345 @@ class DataManager:
         if "custom_columns" not in self.settings:
             self.settings["custom_columns"] = []
         self.ensure_backup_dir()
+        self.backups = BackupStore(BACKUP_DIR)
+
+        # Chiqindi qutisi va tarix birinchi murojaatda (yoki fonda) yuklanadi,
+        # ishga tushish vaqti faqat asosiy jadvalga bog'liq bo'lsin
+        self._trash = None
+        self._activity_log = None
+        self.lazy_lock = threading.Lock()
+
+        # Saqlash usuli: JSON (snapshot + jurnal) yoki SQLite
+        self.store = None
+        self.journal_count = 0
+        self.data = [] # Ro'yxat obyekti o'zgarmaydi, yuklash uni joyida to'ldiradi
+        self.by_uuid = {} # {uuid: yozuv} - jadval qatori (iid=uuid) -> yozuv, har o'zgarishda yangilanadi
+        self.inn_index = {} # {inn: set(uuid)} - dublikat tekshiruvi qayta skanersiz
+        self.inn_kinds = {} # {inn: Counter(kategoriya)} - INN ichida har kategoriya/rol necha marta
+        self.dup_inns = set() # Bitta kategoriya/rolda takrorlangan (raqamli) INN lar; MFY ro'yxatlari emas
+        self.search = SearchIndex()
+        self.completions = CompletionIndex()
+        self.roster = {} # {mahalla kaliti: {kategoriya: set(uuid)}} - MFY va uning xodimlari
+        self.version = 0 # Har o'zgarishda oshadi (filtr keshi uchun)
+        self.loaded = False
+        self.load_failed = False # Baza fayli o'qilmadi: bo'sh ro'yxat uning ustidan yozilmasligi kerak
+        self.load_stats = {}
+        self.derived = DerivedCache()
+
+        # Boshqa nusxalar bilan ishlash: har amalda shu nusxa identifikatori (src) yoziladi,
+        # poll_remote jurnalning o'qilmagan qismidan faqat boshqalarning amallarini oladi
+        self.src = uuid.uuid4().hex[:12]
+        self.journal_epoch = "" # Jurnal sarlavhasidagi davr (har snapshotda yangilanadi)
+        self.journal_offset = 0 # Jurnalning shu nusxa o'qib bo'lgan joyi (bayt)
+        self.db_sig = None
+        self.changes_seq = 0 # SQLite: changes jadvalidan o'qilgan oxirgi amal
+        self.op_seq = 0
+        self.local_marks = {} # {(uuid, maydon yoki None): op_seq} - o'zimizning oxirgi tahrirlarimiz
+        self.marks_floor = 0
+        self.remote_inflight = False # O'qilgan, lekin UI oqimida hali qo'llanmagan amallar bor
+        self.remote_pending = None # O'sha amallar (close() UI kutmasdan o'zi qo'llashi uchun)
+        self.poll_lock = threading.Lock()
+        self.bulk_gen = 0 # To'liq qayta yozishlar (ommaviy amallar) soni
+        self.bulk_written = 0
+        self.closing = False
+        if load: self.load_data()
+
+    def load_data(self, progress=None):
+        # Asosiy jadvalni yuklash. Oyna ochilgandan keyin fon oqimida chaqiriladi.
+        t0 = time.perf_counter()
+        sig = self.source_signature() # O'qishdan oldin: kesh aynan shu fayl holatiga tegishli bo'lsin
+        if self.settings.get("storage") == "sqlite" and os.path.exists(SQLITE_FILE):
+            self.store = SQLiteStore(file_lock=self.file_lock)
+            self.changes_seq = self.store.last_change()
+            records = self.store.load_orgs()
+            version = self.store.get_schema_version()
+            t1 = time.perf_counter()
+            self.data[:] = records
+        else:
+            # Snapshot va jurnal bir holatdan o'qilishi kerak: boshqa nusxa shu payt jurnalni almashtirmasin
+            locked = self.file_lock.acquire()
+            try:
+                db = self.read_db(progress)
+                if db is None:
+                    self.load_failed = True
+                    self.keep_corrupt(DB_FILE)
+                version, records = db or (SCHEMA_VERSION, [])
+                t1 = time.perf_counter()
+                self.data[:] = records
+                self.load_journal()
+            finally:
+                if locked: self.file_lock.release()
+        # Eski sxema: bir marta o'tkazib saqlaymiz, keyin filtr/dashboard faqat hozirgi ko'rinishni ko'radi
+        migrated = not self.load_failed and migrate_records(self.data, version)
+        if migrated:
+            self.save_data()
+            if self.store: self.store.set_schema_version(SCHEMA_VERSION)
+        if self.reindex(): self.save_data()
+        if not self.store and self.settings.get("storage") == "sqlite":
+            self.migrate_to_sqlite() # SQLite fayli hali yo'q: JSON dan import
+        cached = self.derived.load(sig)
+        t2 = time.perf_counter()
+        
+        self.loaded = True
+        self.load_stats = {
+            "records": len(self.data),
+            "parse_ms": round((t1 - t0) * 1000),
+            "journal_ms": round((t2 - t1) * 1000),
+            "journal_ops": self.journal_count,
+            "schema_migrated": migrated,
+            "derived_cache": cached,
+            "load_failed": self.load_failed,
+        }
+        logging.info(f"Baza yuklandi: {self.load_stats}")
+        if not cached:
+            threading.Thread(target=self.derived.build, args=(self.data,), daemon=True).start()
+
+    def source_signature(self):
+        # Hisoblangan qiymatlar keshi shu fayllar holatiga bog'lanadi
+        if self.store or self.settings.get("storage") == "sqlite":
+            return file_signature(SQLITE_FILE, SQLITE_FILE + "-wal")
+        return file_signature(DB_FILE, JOURNAL_FILE)
+
+    def category_counts(self):
+        return self.derived.category_counts(self.data)
+
+    def reindex(self):
+        # uuid -> yozuv indeksini qayta qurish. Takroriy uuid (masalan, jadvaldan nusxalangan "Tizim ID")
+        # yangisiga almashtiriladi, aks holda jadval qatori ikki yozuvga ishora qilardi. Tuzatilganlar soni.
+        index, fixed = {}, 0
+        self.version += 1
+        for i in self.data:
+            u = i.get("uuid")
+            if not u or u in index:
+                i["uuid"] = u = str(uuid.uuid4())
+                fixed += 1
+            index[u] = i
+        self.by_uuid = index
+        self.inn_index, self.inn_kinds, self.dup_inns = {}, {}, set()
+        for i in self.data: self.index_inn(i)
+        self.roster = {}
+        for i in self.data: self.index_roster(i)
+        self.rebuild_search()
+        if fixed: logging.warning(f"{fixed} ta yozuvga yangi UUID berildi (takroriy/bo'sh)")
+        return fixed
+
+    # --- QIDIRUV INDEKSI ---
+    def search_fields(self):
+        return ("m", "f", "t", "inn", "izoh", *self.settings.get("custom_columns", []))
+
+    def completion_fields(self):
+        return ("m", "f", *self.settings.get("custom_columns", []))
+
+    def rebuild_search(self, reset=True):
+        # Fonda qurish; tayyor bo'lguncha filter_data oddiy qidiruvdan foydalanadi
+        with self.search.lock:
+            self.search.gen += 1 # Oldingi (eski ma'lumotli) qurish natijasi qabul qilinmaydi
+            if reset: self.search.ready = False
+        def build():
+            for _ in range(5):
+                if self.completions.build(self.data, self.completion_fields()): break
+            for _ in range(5):
+                if self.search.build(self.data, self.search_fields()): return
+            logging.warning("Qidiruv indeksi qurilmadi (ma'lumot tinimsiz o'zgarmoqda)")
+        threading.Thread(target=build, name="SearchIndex", daemon=True).start()
+
+    def search_records(self, q, field):
+        # Trigram indeks orqali; None - oddiy qidiruv kerak
+        if self.search.needs_rebuild():
+            self.search.stale = 0
+            self.rebuild_search(reset=False)
+        return self.search.search(q, field)
+
+    def phone_of(self, item):
+        return self.derived.entry(item)[3]
+
+    def category_records(self, cat):
+        # Kategoriya yozuvlari (indeksdan); None - indeks hali qurilmoqda
+        return self.search.category(cat)
+
+    def fuzzy_records(self, q, field):
+        # "~" qidiruvi: farqi eng kichik yozuvlar birinchi; None - indeks hali qurilmoqda
+        if field not in FUZZY_FIELDS: field = "m"
+        res = self.search.fuzzy(search_key(q), field)
+        return None if res is None else [i for d, i in res]
+
+    def query_plan(self, terms, cat="Barchasi"):
+        # parse_query natijasi -> (nomzodlar yoki None, tekshiruvchi funksiya).
+        # Nomzodlar - eng tor indeks natijasi: trigram yoki kategoriya ro'yxatlari (turi: shartlari va tab
+        # kategoriyalar nomlarida tekshiriladi). Barcha shartlar baribir har nomzodda tekshiriladi.
+        rows, cats = None, None if cat == "Barchasi" else {cat}
+        for field, value, prefix, neg in terms:
+            if field == "s":
+                if self.search.ready:
+                    ok = {c for c in list(self.search.cats) if query_term_ok(search_key("" if c is None else c), value, prefix) != neg}
+                    cats = ok if cats is None else cats & ok
+                continue
+            if neg or (prefix and field == "t"): continue
+            hits = self.search.search(value, field)
+            if hits is not None and (rows is None or len(hits) < len(rows)): rows = hits
+        if cats is not None:
+            listed = self.search.categories(cats)
+            if listed is not None and (rows is None or len(listed) < len(rows)): rows = listed
+
+        entry, key = self.derived.entry, self.derived.key # Qidiruv kalitlari keshdan
+        checks = [(field, phone_query(value) if field == "t" else value, prefix, neg)
+                  for field, value, prefix, neg in terms]
+
+        def match(i):
+            for field, value, prefix, neg in checks:
+                if field == "t": # Telefon (+998...)
+                    t = phone_national(entry(i)[3])
+                    ok = t.startswith(value) if prefix else (phone_match(t, value) if value else not t)
+                else: ok = query_term_ok(key(i, field), value, prefix)
+                if ok == neg: return False
+            return True
+        return rows, match
+
+    def index_changed(self, item, fields):
+        searchable = {"s", *self.search_fields()} # "s" - kategoriya ro'yxatlari uchun
+        changed = [f for f in fields if f in searchable]
+        if changed: self.search.update(item, changed)
+
+    def index_fields(self, item, fields=None):
+        # Maydon(lar) o'zgargandan keyin: avto-to'ldirish va mahalla ro'yxati (fields=None - butun yozuv)
+        self.completions.count(item, +1, fields)
+        if fields is None or {"s", "inn", "m"} & set(fields): self.index_roster(item)
+
+    def unindex_fields(self, item, fields=None):
+        # O'zgarishdan oldin: eski qiymatlar indekslardan chiqariladi
+        self.completions.count(item, -1, fields)
+        if fields is None or {"s", "inn", "m"} & set(fields): self.unindex_roster(item)
+
+    # --- MAHALLA RO'YXATI (MFY -> xodimlar) ---
+    @staticmethod
+    def roster_key(item):
+        # Mahalla va xodimlari bir xil INN da; INN yo'q/"0" bo'lsa - mahalla nomi bo'yicha
+        inn = item.get("inn", "")
+        return inn if inn.isdigit() and inn.strip("0") else "nomi:" + search_key(item.get("m", "")).strip()
+
+    def index_roster(self, item):
+        s = item.get("s")
+        if s != MAHALLA_CATEGORY and s not in MAHALLA_ROLES: return
+        self.roster.setdefault(self.roster_key(item), {}).setdefault(s, set()).add(item["uuid"])
+
+    def unindex_roster(self, item):
+        key = self.roster_key(item)
+        group = self.roster.get(key)
+        uuids = group and group.get(item.get("s"))
+        if not uuids: return
+        uuids.discard(item["uuid"])
+        if not uuids: del group[item.get("s")]
+        if not group: del self.roster[key]
+
+    def roster_rows(self):
+        # Har mahalla uchun bitta qator: {"name", "inn", "mahalla", rol: [yozuvlar], "gaps": [yetishmaydiganlar]}
+        rows = []
+        for key, group in self.roster.items():
+            row = {role: sorted((self.by_uuid[u] for u in group.get(role, ())), key=lambda i: str(i.get("f", "")))
+                   for role in (MAHALLA_CATEGORY, *MAHALLA_ROLES)}
+            first = next(items[0] for items in row.values() if items)
+            row["mahalla"] = row[MAHALLA_CATEGORY][0] if row[MAHALLA_CATEGORY] else None
+            row["name"] = (row["mahalla"] or first).get("m", "")
+            row["inn"] = "" if key.startswith("nomi:") else key
+            row["gaps"] = [role for role in (MAHALLA_CATEGORY, *MAHALLA_ROLES) if not row[role]]
+            rows.append(row)
+        rows.sort(key=lambda r: search_key(r["name"]))
+        return rows
+
+    # --- INN INDEKSI ---
+    def index_inn(self, item):
+        inn = item.get("inn")
+        if not inn: return
+        uuids = self.inn_index.setdefault(inn, set())
+        if item["uuid"] in uuids: return
+        uuids.add(item["uuid"])
+        self.inn_kinds.setdefault(inn, collections.Counter())[item.get("s", "")] += 1
+        self.mark_dup_inn(inn)
+
+    def unindex_inn(self, item):
+        inn = item.get("inn")
+        uuids = self.inn_index.get(inn)
+        if not uuids or item["uuid"] not in uuids: return
+        uuids.discard(item["uuid"])
+        kinds = self.inn_kinds[inn]
+        kinds[item.get("s", "")] -= 1
+        if kinds[item.get("s", "")] <= 0: del kinds[item.get("s", "")]
+        if not uuids:
+            del self.inn_index[inn], self.inn_kinds[inn]
+        self.mark_dup_inn(inn)
+
+    def mark_dup_inn(self, inn):
+        # Mahalla + xodimlari bitta INN da (har rol bir marta) - bu dublikat emas.
+        # Dublikat: bir INN bitta kategoriya/rolda kamida ikki marta uchrasa.
+        kinds = self.inn_kinds.get(inn)
+        if inn.isdigit() and kinds and max(kinds.values()) > 1: self.dup_inns.add(inn)
+        else: self.dup_inns.discard(inn)
+
+    def duplicate_groups(self):
+        # {inn: [yozuvlar]} - bitta kategoriya/rolda takrorlangan (raqamli) INN lar, guruh ichida nomi bo'yicha
+        return {inn: sorted((self.by_uuid[u] for u in self.inn_index[inn]), key=lambda i: str(i.get("m", "")))
+                for inn in sorted(self.dup_inns)}
+
+    def duplicate_count(self):
+        return len(self.dup_inns)
+
+    def get(self, u):
+        return self.by_uuid.get(u)
+
+    def read_db(self, progress=None):
+        # (sxema versiyasi, yozuvlar) yoki None - fayl buzilgan/chala (bo'sh baza deb hisoblanmaydi).
+        # Katta fayl bo'laklab o'qiladi, har 1000 yozuvda progress() chaqiriladi
+        if not os.path.exists(DB_FILE): return SCHEMA_VERSION, []
+        try:
+            if os.path.getsize(DB_FILE) < STREAM_LOAD_MIN_BYTES:
+                with open(DB_FILE, "r", encoding="utf-8") as f: return unwrap_db(json.load(f))
+            records = []
+            version = db_header(DB_FILE).get("schema_version", 1)
+            for rec in iter_json_array(DB_FILE):
+                records.append(rec)
+                if progress and len(records) % 1000 == 0: progress(len(records))
+            return version, records
+        except Exception as e:
+            logging.error(f"{DB_FILE} o'qilmadi: {e}")
+            return None
+
+    def db_payload(self):
+        # Diskdagi ko'rinish: sarlavha + yozuvlar (journal_epoch/folded ni write_snapshot to'ldiradi)
+        return {"schema_version": SCHEMA_VERSION, "journal_epoch": "", "folded": True, "records": self.data}
+
+    # --- KECHIKTIRILGAN YUKLASH ---
+    @property
+    def trash(self):
+        return self._trash if self._trash is not None else self.load_trash()
+
+    @property
+    def activity_log(self):
+        return self._activity_log if self._activity_log is not None else self.load_activity_log()
+
+    def load_trash(self):
+        with self.lazy_lock:
+            if self._trash is None:
+                self._trash = self.store.load_trash() if self.store else self.load_json(TRASH_FILE)
+        return self._trash
+
+    def load_activity_log(self):
+        with self.lazy_lock:
+            if self._activity_log is None:
+                self._activity_log = self.store.load_log() if self.store else self.load_json(LOG_FILE)
+        return self._activity_log
+
+    def preload_secondary(self):
+        # Birinchi kadr chizilgandan keyin fon oqimida oldindan yuklab qo'yish
+        def load():
+            self.load_trash()
+            self.load_activity_log()
+        threading.Thread(target=load, daemon=True).start()
+
+    def recent_activity(self, n=5):
+        # Dashboard uchun oxirgi n ta yozuv, butun tarixni parse qilmasdan
+        if self._activity_log is not None: return self._activity_log[:n]
+        if self.store: return self.store.load_log(n)
+        return read_json_head(LOG_FILE, n)
 
     def ensure_backup_dir(self):
         if not os.path.exists(BACKUP_DIR):
@@ -67,11 +1756,363 @@ class DataManager:
             try:
                 with open(filepath, "r", encoding="utf-8") as f:
                     return json.load(f)
-            except: return []
+            except Exception as e:
+                logging.error(f"{filepath} o'qilmadi: {e}")
+                self.keep_corrupt(filepath)
+                return []
         return []
 
-    def save_data(self):
-        self.save_json(DB_FILE, self.data)
+    def keep_corrupt(self, filepath):
+        # Buzilgan faylni keyingi saqlash ustidan yozib yubormasligi uchun nusxasini qoldiramiz
+        try: shutil.copy2(filepath, f"{filepath}.corrupt-{time.strftime('%Y%m%d_%H%M%S')}")
+        except: pass
+
+    def save_data(self, fold=False):
+        # fold=True - jurnalni yig'ish (faqat jurnal amallari), aks holda ommaviy o'zgarish:
+        # boshqa nusxalar snapshotni to'liq solishtiradi
+        if not fold: self.version += 1 # Yozuvlar to'g'ridan-to'g'ri o'zgartirilgan bo'lishi mumkin
+        if self.load_failed:
+            # Xotirada buzilgan fayl o'rniga bo'sh/chala ro'yxat: diskdagi bazani almashtirmaymiz (amallar jurnalda)
+            logging.error("Baza o'qilmagan edi: snapshot yozilmadi")
+            return
+        if self.store:
+            if not fold: self.store.replace_orgs(self.data, self.src)
+            return
+        if not fold: self.bulk_gen += 1
+        # To'liq snapshot: jurnaldagi barcha amallar endi bazada, jurnal tozalanadi
+        self.writer.replace(DB_FILE, self.db_payload(), reset=JOURNAL_FILE)
+        self.journal_count = 0
+
+    def migrate_to_sqlite(self):
+        # Bir martalik import: joriy JSON ma'lumotlari SQLite ga ko'chiriladi.
+        # Keyin mahalla_bazasi.json faqat eksport (yopilishda yangilanadi va zaxiralanadi).
+        if self.store: return False
+        self.compact_journal()
+        for i in self.trash:
+            if not i.get("uuid"): i["uuid"] = str(uuid.uuid4())
+        store = SQLiteStore(file_lock=self.file_lock)
+        store.import_json(self.data, self.trash, self.activity_log)
+        self.store = store
+        self.settings["storage"] = "sqlite"
+        self.save_settings()
+        logging.info(f"SQLite: {len(self.data)} ta yozuv import qilindi")
+        return True
+
+    def find_by_inn(self, inn):
+        return [self.by_uuid[u] for u in self.inn_index.get(normalize_inn(inn), ())]
+
+    # --- O'ZGARISHLAR JURNALI ---
+    # Har bir tahrir butun bazani qayta yozmaydi: jurnalga bitta ixcham qator qo'shiladi.
+    # Ishga tushganda: snapshot (DB_FILE) + jurnal = joriy holat.
+
+    def load_journal(self):
+        # UUID yo'q yozuvlarga UUID berish (jurnal amallari UUID bo'yicha ishlaydi)
+        missing = False
+        for i in self.data:
+            if not i.get("uuid"):
+                i["uuid"] = str(uuid.uuid4())
+                missing = True
+
+        if os.path.exists(JOURNAL_FILE):
+            by_uuid = {i["uuid"]: i for i in self.data}
+            removed = set()
+            with open(JOURNAL_FILE, "rb") as f:
+                raw = f.read()
+            end = raw.rfind(b"\n") + 1 # Yozilayotgan (tugallanmagan) oxirgi qator keyingi o'qishga qoladi
+            self.journal_epoch = journal_epoch_of(raw)
+            self.journal_offset = end
+            for op in parse_journal(raw[:end]):
+                self.apply_op(op, by_uuid, removed)
+                self.journal_count += 1
+            if removed:
+                self.data[:] = [i for i in self.data if id(i) not in removed]
+            logging.info(f"Jurnal: {self.journal_count} ta amal qayta qo'llandi")
+        self.db_sig = file_signature(DB_FILE)
+
+        if missing or self.journal_count >= JOURNAL_COMPACT_LIMIT:
+            self.save_data(fold=not missing)
+
+    def apply_op(self, op, by_uuid, removed, data=None):
+        # Amallar idempotent: snapshot yozilib, jurnal tozalanmay qolsa ham qayta qo'llash xavfsiz
+        kind = op.get("op")
+        if kind == "add":
+            item = op["item"]
+            existing = by_uuid.get(item.get("uuid"))
+            if existing is not None:
+                existing.clear()
+                existing.update(item)
+            else:
+                (self.data if data is None else data).append(item)
+                by_uuid[item.get("uuid")] = item
+        elif kind == "set":
+            item = by_uuid.get(op.get("uuid"))
+            if item is not None:
+                item.update(op.get("fields", {}))
+                for k in op.get("unset", []): item.pop(k, None)
+        elif kind == "del":
+            item = by_uuid.pop(op.get("uuid"), None)
+            if item is not None: removed.add(id(item))
+
+    def record_op(self, op):
+        # Bitta o'zgarishni saqlash: SQLite da bitta qatorli SQL, JSON rejimida jurnal qatori
+        op["src"] = self.src
+        self.version += 1
+        self.mark_local(op)
+        if self.store: self.store.apply_op(op)
+        else: self.append_journal(op)
+
+    def mark_local(self, op):
+        # Keyin kelgan boshqa nusxa amali shu maydonlarni eski qiymatga qaytarmasligi uchun
+        self.op_seq += 1
+        for key in op_keys(op): self.local_marks[key] = self.op_seq
+        if len(self.local_marks) > 10000:
+            floor = self.marks_floor
+            self.local_marks = {k: n for k, n in self.local_marks.items() if n > floor}
+
+    def append_journal(self, op):
+        self.writer.append(JOURNAL_FILE, json.dumps(op, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.journal_count += 1
+        if self.journal_count >= JOURNAL_COMPACT_LIMIT:
+            self.compact_journal()
+
+    def compact_journal(self):
+        # Jurnalni yangi snapshotga yig'ish
+        if self.journal_count:
+            self.save_data(fold=True)
+
+    # --- BIR NECHTA NUSXA (UMUMIY PAPKA) ---
+    # Jurnal birinchi qatorida {"epoch": ...}. Snapshot yozilganda eski jurnal mahalla_bazasi.journal.<epoch>
+    # nomiga o'tkaziladi: uni hali oxirigacha o'qimagan nusxalar qolgan amallarni o'sha yerdan oladi.
+
+    def read_unseen(self):
+        # Qulf ostida: (o'qilmagan jurnal qatorlari, yangi davr, yangi offset, to'liq solishtirish kerakmi)
+        raw = b""
+        if os.path.exists(JOURNAL_FILE):
+            with open(JOURNAL_FILE, "rb") as f: raw = f.read()
+        epoch = journal_epoch_of(raw)
+        if epoch == self.journal_epoch:
+            end = max(raw.rfind(b"\n") + 1, self.journal_offset)
+            return raw[self.journal_offset:end], epoch, end, False
+        # Boshqa nusxa snapshot yozgan: eski jurnal qoldig'i + yangi jurnal
+        old = f"{JOURNAL_FILE}.{self.journal_epoch or 'old'}"
+        missing = not os.path.exists(old) and self.journal_offset > 0 # Eski jurnal allaqachon o'chirilgan
+        reconcile = missing or not db_header(DB_FILE).get("folded", False)
+        tail = b""
+        if not reconcile and os.path.exists(old):
+            with open(old, "rb") as f:
+                f.seek(self.journal_offset)
+                tail = f.read()
+        end = raw.rfind(b"\n") + 1
+        return tail + raw[:end], epoch, end, reconcile
+
+    def write_snapshot(self, path, payload, journal, pending):
+        # PersistWriter oqimida, qulf ostida: snapshot + yangi davrli jurnal.
+        # Yangi jurnalga biz hali qo'llamagan boshqa nusxa qatorlari va o'zimizning navbatdagi qatorlar o'tadi.
+        if self.remote_inflight: return False # O'qilgan begona amallar hali xotirada yo'q
+        tail, disk_epoch, _, reconcile = self.read_unseen()
+        if reconcile: return False # Avval poll_remote to'liq solishtirsin
+        g = self.bulk_gen
+        epoch = uuid.uuid4().hex[:12]
+        payload["journal_epoch"] = epoch
+        payload["folded"] = g == self.bulk_written
+        header = json.dumps({"epoch": epoch}) + "\n"
+        atomic_write(path, json.dumps(snapshot_of(payload), indent=4, ensure_ascii=False))
+        if os.path.exists(journal):
+            os.replace(journal, f"{journal}.{disk_epoch or 'old'}")
+        atomic_write(journal, header + tail.decode("utf-8") + "".join(pending))
+        self.bulk_written = g
+        self.journal_epoch = epoch
+        self.journal_offset = len(header.encode("utf-8"))
+        self.db_sig = file_signature(path)
+        self.prune_rotated(journal)
+        return True
+
+    def prune_rotated(self, journal):
+        folder = os.path.dirname(os.path.abspath(journal))
+        prefix = os.path.basename(journal) + "."
+        now = time.time()
+        for name in os.listdir(folder):
+            if not name.startswith(prefix) or name.endswith(".tmp"): continue
+            p = os.path.join(folder, name)
+            try:
+                if now - os.path.getmtime(p) > ROTATED_JOURNAL_KEEP_SECONDS: os.remove(p)
+            except OSError: pass
+
+    def poll_remote(self, final=False):
+        # Fon oqimida: boshqa nusxalarning yangi amallari -> (amallar, read_seq) yoki None.
+        # Natija UI oqimida apply_remote orqali qo'llanadi. final=True - close() dan, yopilish paytida.
+        if not self.loaded or self.remote_inflight or (self.closing and not final): return None
+        with self.poll_lock: # close() shu poll tugashini kutadi
+            if self.remote_inflight or (self.closing and not final): return None
+            if self.store: return self.poll_store()
+            try:
+                size = os.path.getsize(JOURNAL_FILE)
+            except OSError:
+                size = 0
+            if size == self.journal_offset and file_signature(DB_FILE) == self.db_sig:
+                self.marks_floor = self.op_seq
+                return None
+            read_seq = self.op_seq
+            self.writer.flush() # read_seq gacha bo'lgan o'z amallarimiz diskda bo'lsin
+            if not self.file_lock.acquire(timeout=5.0 if final else 0.5): return None
+            try:
+                lines, epoch, offset, reconcile = self.read_unseen()
+                disk = self.read_disk_state() if reconcile else None
+                if reconcile and disk is None: return None # Snapshot o'qilmadi: keyingi pollda qayta urinamiz
+                self.journal_epoch, self.journal_offset = epoch, offset
+                self.remote_inflight = True # Qulf bo'shagach snapshot bu amallarsiz yozilib qolmasin
+                self.db_sig = file_signature(DB_FILE)
+            finally:
+                self.file_lock.release()
+            if reconcile:
+                logging.info("Boshqa nusxa bazani to'liq yozgan: farqlar solishtirilmoqda")
+                ops = ops_between(snapshot_of(self.data), disk)
+            else:
+                ops = list(parse_journal(lines))
+                self.journal_count += len(ops)
+                ops = remote_ops(ops, self.src)
+            return self.queue_remote(ops, read_seq)
+
+    def poll_store(self):
+        read_seq = self.op_seq
+        rows = self.store.changes_since(self.changes_seq)
+        if rows is not None and not rows:
+            self.marks_floor = read_seq
+            return None
+        if rows is None or any(op.get("op") == "reload" and op.get("src") != self.src for _, op in rows):
+            disk = self.store.load_orgs()
+            self.changes_seq = self.store.last_change()
+            ops = ops_between(snapshot_of(self.data), disk)
+        else:
+            self.changes_seq = rows[-1][0]
+            ops = remote_ops([op for _, op in rows], self.src)
+        return self.queue_remote(ops, read_seq)
+
+    def queue_remote(self, ops, read_seq):
+        if not ops:
+            self.marks_floor = read_seq
+            self.remote_inflight = False
+            return None
+        self.remote_inflight = True
+        self.remote_pending = ops, read_seq
+        return self.remote_pending
+
+    def read_disk_state(self):
+        # Snapshot + yangi jurnal (qulf ostida chaqiriladi)
+        db = self.read_db()
+        if db is None: return None
+        _, records = db
+        by_uuid = {i.get("uuid"): i for i in records}
+        removed = set()
+        if os.path.exists(JOURNAL_FILE):
+            with open(JOURNAL_FILE, "rb") as f: raw = f.read()
+            for op in parse_journal(raw[:raw.rfind(b"\n") + 1]):
+                self.apply_op(op, by_uuid, removed, records)
+        migrate_records(records, 1)
+        return [i for i in records if id(i) not in removed]
+
+    def apply_remote(self, ops, read_seq):
+        # UI oqimida: boshqa nusxa amallarini xotiradagi ro'yxatga qo'llash -> [(turi, yozuv)]
+        # read_seq dan keyin o'zimiz tahrirlagan maydonlarga tegilmaydi (diskda ham bizniki keyin yozilgan).
+        if self.remote_pending is None or self.remote_pending[0] is not ops: return [] # close() allaqachon qo'llagan
+        marks = self.local_marks
+        changes = []
+        try:
+            by_uuid = self.by_uuid
+            removed = set()
+            for op in ops:
+                kind = op.get("op")
+                u = op.get("uuid") or op.get("item", {}).get("uuid")
+                if marks.get((u, None), 0) > read_seq: continue
+                if kind == "set":
+                    item = by_uuid.get(u)
+                    fields = {k: v for k, v in op.get("fields", {}).items() if marks.get((u, k), 0) <= read_seq}
+                    unset = [k for k in op.get("unset", []) if marks.get((u, k), 0) <= read_seq]
+                    if item is None or not (fields or unset): continue
+                    self.derived.forget(item)
+                    if "s" in fields: self.derived.move_category(item.get("s"), fields["s"])
+                    self.unindex_inn(item)
+                    self.unindex_fields(item, [*fields, *unset])
+                    self.apply_op({"op": "set", "uuid": u, "fields": fields, "unset": unset}, by_uuid, removed)
+                    self.index_fields(item, [*fields, *unset])
+                    self.index_inn(item)
+                    self.index_changed(item, [*fields, *unset])
+                    changes.append(("set", item))
+                elif kind == "add":
+                    existing = by_uuid.get(u)
+                    if existing is not None:
+                        self.derived.forget(existing, -1)
+                        self.unindex_inn(existing)
+                        self.unindex_fields(existing)
+                    self.apply_op(op, by_uuid, removed)
+                    self.derived.forget(by_uuid[u], +1)
+                    self.index_inn(by_uuid[u])
+                    self.index_fields(by_uuid[u])
+                    if existing is not None: self.index_changed(existing, ["s", *self.search_fields()])
+                    else: self.search.add(by_uuid[u])
+                    changes.append(("set" if existing is not None else "add", by_uuid[u]))
+                elif kind == "del":
+                    item = by_uuid.get(u)
+                    if item is None: continue
+                    self.derived.forget(item, -1)
+                    self.unindex_inn(item)
+                    self.search.remove(item)
+                    self.unindex_fields(item)
+                    self.apply_op(op, by_uuid, removed)
+                    changes.append(("del", item))
+            if removed:
+                self.data[:] = [i for i in self.data if id(i) not in removed]
+        finally:
+            self.marks_floor = read_seq
+            self.remote_inflight = False
+            self.remote_pending = None
+        if changes:
+            self.version += 1
+            logging.info(f"Boshqa nusxadan {len(changes)} ta o'zgarish qo'llandi")
+        return changes
+
+    def add_item(self, item):
+        normalize_fields(item)
+        if not item.get("uuid") or item["uuid"] in self.by_uuid: item["uuid"] = str(uuid.uuid4())
+        self.data.append(item)
+        self.by_uuid[item["uuid"]] = item
+        self.index_inn(item)
+        self.search.add(item)
+        self.index_fields(item)
+        self.derived.forget(item, +1)
+        self.record_op({"op": "add", "item": item})
+
+    def update_item(self, item, fields, unset=()):
+        # Faqat o'zgargan maydonlar jurnalga yoziladi
+        changed = {k: v for k, v in normalize_fields(dict(fields)).items() if item.get(k) != v}
+        dropped = [k for k in unset if k in item]
+        if not changed and not dropped: return False
+        self.derived.forget(item)
+        if "s" in changed: self.derived.move_category(item.get("s"), changed["s"])
+        reindex_inn = bool({"inn", "s"} & {*changed, *dropped}) # Dublikat belgisi kategoriyaga ham bog'liq
+        if reindex_inn: self.unindex_inn(item)
+        self.unindex_fields(item, [*changed, *dropped])
+        item.update(changed)
+        for k in dropped: del item[k]
+        self.index_fields(item, [*changed, *dropped])
+        if reindex_inn: self.index_inn(item)
+        self.index_changed(item, [*changed, *dropped])
+        op = {"op": "set", "uuid": item["uuid"], "fields": changed}
+        if dropped: op["unset"] = dropped
+        self.record_op(op)
+        return True
+
+    def remove_items(self, items):
+        # Ko'p yozuvni bitta o'tishda o'chirish (har biri uchun list.remove emas)
+        ids = {id(i) for i in items}
+        self.data[:] = [i for i in self.data if id(i) not in ids]
+        for item in items:
+            self.by_uuid.pop(item["uuid"], None)
+            self.unindex_inn(item)
+            self.search.remove(item)
+            self.unindex_fields(item)
+            self.derived.forget(item, -1)
+            self.record_op({"op": "del", "uuid": item["uuid"]})
 
     def save_trash(self):
         self.save_json(TRASH_FILE, self.trash)
@@ -94,51 +2135,130 @@ class DataManager:
             self.activity_log.insert(0, entry)
             if len(self.activity_log) > 1000:
                 self.activity_log.pop()
-            self.save_json(LOG_FILE, self.activity_log)
+            if self.store: self.store.insert_log(entry)
+            else: self.save_json(LOG_FILE, self.activity_log)
         except: pass
 
     def save_json(self, filepath, data):
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        # Yozish fon oqimida (PersistWriter), UI bloklanmaydi
+        self.writer.replace(filepath, data)
+
+    def close(self):
+        # Dastur yopilishida: jurnalni yig'ish va kutilayotgan barcha yozuvlarni diskka tushirish.
+        # -> yozib bo'lmagan o'zgarishlar tushirilgan recovery fayllar ro'yxati (odatda bo'sh)
+        self.closing = True
+        if not self.loaded or self.load_failed:
+            # Yuklash tugamagan yoki baza o'qilmagan: chala ro'yxatni diskka yozib yubormaslik kerak
+            return self.writer.close()
+        # Fondagi poll tugashini kutib, o'qilgan (UI ga yetmagan) begona amallar va oxirgi o'zgarishlar shu yerda
+        # qo'llanadi. Aks holda write_snapshot rad etadi va oxirgi jurnal amallari snapshotga tushmay qoladi
+        with self.poll_lock: pass
+        if self.remote_pending: self.apply_remote(*self.remote_pending)
+        pending = self.poll_remote(final=True)
+        if pending: self.apply_remote(*pending)
+        self.compact_journal()
+        if self.store:
+            # JSON endi faqat eksport: zaxira va tashqi foydalanish uchun yangilab qo'yamiz
+            self.writer.replace(DB_FILE, self.db_payload())
+            self.store.close()
+        lost = self.writer.close()
+        if lost: return lost # Fayllar yakuniy holatda emas: keshni yozmaymiz
+        # Fayllar yakuniy holatda: kesh shu holat imzosi bilan yoziladi
+        try:
+            self.derived.save(self.source_signature(), self.data)
+        except Exception as e:
+            logging.error(f"Kesh saqlanmadi: {e}")
+        return []
 
     def move_to_trash(self, item):
-        if item in self.data:
-            self.data.remove(item)
-            item["deleted_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        return self.move_items_to_trash([item]) > 0
+
+    def move_items_to_trash(self, items):
+        items = [i for i in items if i is not None and self.by_uuid.get(i.get("uuid")) is i]
+        if not items: return 0
+        self.remove_items(items)
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        for item in items:
+            item["deleted_at"] = now
             self.trash.append(item)
-            self.save_data()
-            self.save_trash()
-            return True
-        return False
-
-    def restore_from_trash(self, item):
-        if item in self.trash:
-            self.trash.remove(item)
+            if self.store: self.store.insert_trash(item)
+        if not self.store: self.save_trash()
+        return len(items)
+
+    def restore_items_from_trash(self, items):
+        # Tiklangan yozuvlar ro'yxati
+        items = self.take_from_trash(items)
+        for item in items:
             if "deleted_at" in item: del item["deleted_at"]
-            self.data.append(item)
-            self.save_data()
-            self.save_trash()
-            return True
-        return False
-
-    def permanent_delete(self, item):
-        if item in self.trash:
-            self.trash.remove(item)
-            self.save_trash()
-            return True
-        return False
+            self.add_item(item)
+        return items
+
+    def permanent_delete_items(self, items):
+        return self.take_from_trash(items)
+
+    def take_from_trash(self, items):
+        # Chiqindidan bitta o'tishda olib tashlash (obyekt bo'yicha: bir xil ko'rinishdagi boshqa yozuv emas), bitta saqlash
+        ids = {id(i) for i in items if i is not None}
+        taken = [i for i in self.trash if id(i) in ids]
+        if not taken: return []
+        self.trash[:] = [i for i in self.trash if id(i) not in ids]
+        if self.store: self.store.delete_trash_many([i.get("uuid") for i in taken])
+        else: self.save_trash()
+        return taken
+
+    def list_backups(self):
+        # Tiklash oynasi uchun: (nomi, ko'rinadigan matn), yangidan eskiga
+        items = []
+        for name, ts in self.backups.list_snapshots():
+            items.append((name, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))))
+        for name in self.backups.list_legacy():
+            items.append((name, f"{name[7:22]} (eski nusxa)"))
+        return items
+
+    def restore_snapshot(self, name):
+        # Butun snapshotni tiklash. Avval joriy holat ham zaxiralanadi (qaytarish mumkin bo'lsin).
+        records = self.backups.load(name)
+        self.backups.snapshot(self.data)
+        return self.replace_data(records)
+
+    def replace_data(self, records, version=1):
+        # Butun bazani almashtirish (tiklash, bulutdan yuklash): tashqi ma'lumot ham migratsiyadan o'tadi
+        migrate_records(records, version)
+        self.data[:] = records
+        self.load_failed = False # Butun baza almashtirildi: endi snapshot yozish mumkin
+        self.reindex()
+        self.derived.reset()
+        self.save_data()
+        return len(records)
+
+    def restore_records(self, entries):
+        # Tanlangan yozuvlarni snapshotdagi holatiga qaytarish.
+        # entries: [(turi, eski, yangi)] - diff(snapshot, jonli) natijasidan
+        live = self.by_uuid
+        count = 0
+        to_trash = []
+        for kind, old, new in entries:
+            if kind == "removed": # Snapshotda bor, hozir yo'q
+                self.add_item(dict(old)) # uuid band bo'lsa, add_item yangisini beradi
+            elif kind == "added": # Hozir bor, snapshotda yo'q - hammasi birga chiqindiga
+                to_trash.append(live.get(new.get("uuid")))
+                continue
+            elif kind == "changed":
+                item = live.get(new.get("uuid"))
+                if item is None: continue
+                fields = {k: v for k, v in old.items() if k != "uuid"}
+                self.update_item(item, fields, unset=[k for k in item if k not in old and k != "uuid"])
+            count += 1
+        return count + self.move_items_to_trash(to_trash)
 
     def backup_data(self):
-        if os.path.exists(DB_FILE):
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            backup_path = os.path.join(BACKUP_DIR, f"backup_{timestamp}.json")
-            try:
-                shutil.copy2(DB_FILE, backup_path)
-                # Faqat oxirgi 10 ta nusxani saqlash
-                backups = sorted([os.path.join(BACKUP_DIR, f) for f in os.listdir(BACKUP_DIR)])
-                while len(backups) > 10:
-                    os.remove(backups.pop(0))
-            except: pass
+        # Siqilgan, takrorlanmaydigan snapshot (BackupStore). Eski backup_*.json fayllarga tegilmaydi.
+        if not self.loaded: return
+        try:
+            name = self.backups.snapshot(self.data)
+            if name: logging.info(f"Zaxira: {name}")
+        except Exception as e:
+            logging.error(f"Zaxira xatosi: {e}\n{traceback.format_exc()}")
 
 class MahallaDasturi:
     def __init__(self, root):
@@ -148,13 +2268,121 @@ class MahallaDasturi:
         self.root.configure(bg="#f4f7f6")
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        self.data_manager = DataManager()
+        # Avval oyna (sidebar + "yuklanmoqda"), baza esa fon oqimida yuklanadi
+        self.data_manager = DataManager(load=False)
         self.data = self.data_manager.data
         self.font_size = self.data_manager.settings.get("font_size", 15)
-        self.filtered_data = self.data[:]
+        self.filtered_data = []
+        self.data_ready = False
+        self.pending_view = None
+        self.table_lo = self.table_hi = 0 # filtered_data[table_lo:table_hi] - Treeview da haqiqatan bor qatorlar
+        self.table_rebind = False
+        self.table_selected = set() # Tanlangan yozuvlar uuid (oynadan tashqaridagilari ham)
+        self.table_focus = None
+        self.table_values = {} # Oynadagi qatorlarning jadvalga yozilgan qiymatlari (uuid -> values)
+        self.ui_queue = queue.Queue() # Fon oqimlaridan UI oqimiga vazifalar
+        self.search_gen = 0 # Har yangi qidiruvda oshadi: eskirgan natija jadvalga qo'yilmaydi
+        self.search_after = None
+        self.search_jobs = queue.Queue()
+        self.filter_cache = FilterCache()
+        self.search_pending = None # Natijasi hali jadvalga qo'yilmagan fon qidiruvi (gen)
+        threading.Thread(target=self.search_worker, name="Search", daemon=True).start()
         self.setup_ui()
+        self.root.after_idle(self.mark_first_frame)
+        self.poll_ui_queue()
+        self.start_loading()
+
+    def poll_ui_queue(self):
+        # Tkinter thread-safe emas: fon oqimlari natijani navbatga qo'yadi, bu yerda bajariladi
+        try:
+            while True:
+                task = self.ui_queue.get_nowait()
+                try: task()
+                except Exception as e: logging.error(f"UI vazifa xatosi: {e}\n{traceback.format_exc()}")
+        except queue.Empty: pass
+        self.root.after(50, self.poll_ui_queue)
+
+    def mark_first_frame(self):
+        logging.info(f"Startup: birinchi kadr {round((time.perf_counter() - APP_START) * 1000)} ms")
+
+    def start_loading(self):
+        def progress(n):
+            self.ui_queue.put(lambda: self.update_loading(n))
+
+        def worker():
+            try:
+                self.data_manager.load_data(progress)
+                self.ui_queue.put(self.on_data_loaded)
+            except Exception as e:
+                logging.error(f"Baza yuklash xatosi: {e}\n{traceback.format_exc()}")
+                self.ui_queue.put(lambda err=str(e): messagebox.showerror("Xato", f"Bazani yuklab bo'lmadi:\n{err}"))
+        threading.Thread(target=worker, daemon=True).start()
+
+    def update_loading(self, n):
+        if self.current_view == "loading" and hasattr(self, "lbl_loading"):
+            self.lbl_loading.configure(text=f"{n} ta yozuv o'qildi...")
+
+    def on_data_loaded(self):
+        self.data_ready = True
+        self.filtered_data = self.data[:]
+        stats = self.data_manager.load_stats
+        logging.info(f"Startup: ma'lumot tayyor {round((time.perf_counter() - APP_START) * 1000)} ms "
+                     f"({stats.get('records')} ta, parse {stats.get('parse_ms')} ms, jurnal {stats.get('journal_ms')} ms)")
+        
+        view = self.pending_view or self.show_dashboard
+        self.pending_view = None
+        view()
+        if stats.get("load_failed"):
+            messagebox.showerror("Baza xatosi", f"{DB_FILE} o'qilmadi (buzilgan yoki chala).\n"
+                                 "Fayl o'zgartirilmadi, nusxasi .corrupt-* nomi bilan saqlandi. Zaxiradan tiklang.")
+        self.root.after(500, self.data_manager.preload_secondary) # Trash va tarix - fonda
+        self.start_remote_poller()
+
+    def start_remote_poller(self):
+        # Umumiy papkadagi boshqa operatorlar o'zgarishlarini kuzatish (fon oqimi)
+        def loop():
+            while not self.data_manager.closing:
+                time.sleep(REMOTE_POLL_SECONDS)
+                try:
+                    res = self.data_manager.poll_remote()
+                except Exception as e:
+                    logging.error(f"Poll xatosi: {e}\n{traceback.format_exc()}")
+                    continue
+                if res: self.ui_queue.put(lambda r=res: self.apply_remote_changes(*r))
+        threading.Thread(target=loop, name="RemotePoller", daemon=True).start()
+
+    def apply_remote_changes(self, ops, read_seq):
+        changes = self.data_manager.apply_remote(ops, read_seq)
+        if not changes: return
+        if self.current_view == "table": self.refresh_rows(changes)
+        elif self.current_view == "dashboard": self.show_dashboard()
+        elif self.current_view == "roster": self.show_roster()
+        self.show_toast(f"🔄 Boshqa operator: {len(changes)} ta o'zgarish")
+
+    def wait_for_data(self, view):
+        # Baza hali yuklanayotgan bo'lsa, tanlangan bo'lim yuklash tugagach ochiladi
+        self.pending_view = view
+        self.show_toast("Ma'lumotlar yuklanmoqda...")
+
+    def show_loading(self):
+        self.clear_content()
+        self.current_view = "loading"
+        t = self.themes[self.current_theme]
+        
+        box = tk.Frame(self.content_area, bg=t["content_bg"])
+        box.place(relx=0.5, rely=0.45, anchor="center")
+        tk.Label(box, text="Ma'lumotlar yuklanmoqda...", font=("Segoe UI", int(self.font_size * 1.4), "bold"), bg=t["content_bg"], fg=t["text"]).pack(pady=10)
+        bar = ctk.CTkProgressBar(box, mode="indeterminate", width=300)
+        bar.pack(pady=10)
+        bar.start()
+        self.lbl_loading = tk.Label(box, text="", font=("Segoe UI", int(self.font_size * 0.8)), bg=t["content_bg"], fg="#94a3b8")
+        self.lbl_loading.pack()
 
     def on_close(self):
+        lost = self.data_manager.close() # Zaxira to'liq bazadan olinishi uchun avval diskka yozamiz
+        if lost:
+            messagebox.showerror("Saqlash xatosi", "Baza qulfi band yoki fayl yozilmadi: oxirgi o'zgarishlar bazaga tushmadi.\n"
+                                 "Ular quyidagi fayllarga saqlandi (administratorga bering):\n\n" + "\n".join(lost))
         self.data_manager.backup_data()
         self.root.destroy()
 
@@ -254,6 +2482,7 @@ class MahallaDasturi:
         ctk.CTkLabel(self.sidebar, text="ASOSIY", font=("Segoe UI", 12, "bold"), text_color="#95a5a6", anchor="w").pack(fill="x", padx=30, pady=(10,5))
         self.create_sidebar_btn("📊 Dashboard", self.show_dashboard)
         self.create_sidebar_btn("📋 Ro'yxat", self.show_table)
+        self.create_sidebar_btn("🏘 Mahallalar", self.show_roster)
         self.create_sidebar_btn("⚙ Sozlamalar", self.show_settings)
         
         ctk.CTkLabel(self.sidebar, text="TIZIM", font=("Segoe UI", 12, "bold"), text_color="#95a5a6", anchor="w").pack(fill="x", padx=30, pady=(20,5))
@@ -279,7 +2508,7 @@ class MahallaDasturi:
         self.cat_var = tk.StringVar(value="Barchasi") # Global filter variable
         self.style = ttk.Style()
         self.update_style() # Initial style
-        self.show_dashboard()
+        self.show_loading()
 
     def create_sidebar_btn(self, text, cmd, fg_color="transparent", hover_color="#34495e", text_color=None):
         btn = ctk.CTkButton(self.sidebar, text=text, command=cmd, 
@@ -359,6 +2588,7 @@ class MahallaDasturi:
         # Refresh View
         if self.current_view == "dashboard": self.show_dashboard()
         elif self.current_view == "table": self.show_table()
+        elif self.current_view == "roster": self.show_roster()
         elif self.current_view == "trash": self.show_trash()
         
         # Update Styles for Treeview
@@ -400,6 +2630,7 @@ class MahallaDasturi:
             widget.destroy()
 
     def show_dashboard(self):
+        if not self.data_ready: return self.wait_for_data(self.show_dashboard)
         self.clear_content()
         self.current_view = "dashboard"
         
@@ -436,6 +2667,11 @@ class MahallaDasturi:
         # 1. Jami (Katta Karta - To'liq Eniga)
         self.create_modern_card(left_side, "Jami Tashkilotlar", len(self.data), "#2c3e50", "🏢", pady=10)
         
+        # Dublikat INN guruhlari (indeksdan, bosilsa ro'yxat ochiladi)
+        dups = self.data_manager.duplicate_count()
+        if dups:
+            self.create_modern_card(left_side, "Bir xil INN guruhlari", dups, "#e74c3c", "⚠️", pady=(0, 10), command=self.show_duplicates)
+        
         # Grid Container uchun Frame
         grid_frame = ctk.CTkFrame(left_side, fg_color="transparent")
         grid_frame.pack(fill="both", expand=True, pady=10)
@@ -451,19 +2687,10 @@ class MahallaDasturi:
 
         # Mavjud kategoriyalar bo'yicha hisoblash
         total_categorized = 0
+        counts = self.data_manager.category_counts()
         for idx, cat in enumerate(self.data_manager.categories):
-             # Filter logic mirrors filter_data STRICT match + Legacy
-             count = 0
-             for i in self.data:
-                 s_val = str(i.get("s", "")).strip()
-                 is_match = (s_val == cat)
-                 # Legacy
-                 if not is_match:
-                    if cat == "Mahalla (MFY)" and s_val in ["Mahalla", "MFY"]: is_match = True
-                    elif cat == "Maktab" and s_val in ["Maktablar"]: is_match = True
-                    elif cat == "Bog'cha (MTT)" and s_val in ["MTT", "Bog'cha"]: is_match = True
-                 
-                 if is_match: count += 1
+             # Sonlar keshdan (DerivedCache), har chizishda qayta sanalmaydi
+             count = counts.get(cat, 0)
              
              total_categorized += count
              col = colors[idx % len(colors)]
@@ -502,7 +2729,7 @@ class MahallaDasturi:
         row_col = "#f1f5f9" if self.current_theme == "light" else "#334155"
         
         # Show actual last 5 logs from DataManager or dummy if empty
-        recent_logs = self.data_manager.activity_log[:5] if self.data_manager.activity_log else []
+        recent_logs = self.data_manager.recent_activity(5)
         
         if not recent_logs:
              for i in range(3): # Dummy
@@ -614,7 +2841,7 @@ class MahallaDasturi:
         # Animation: Fade in/out (simulated by destroy after time)
         toast.after(3000, toast.destroy)
 
-    def create_modern_card(self, parent, title, value, color, icon, pady=5):
+    def create_modern_card(self, parent, title, value, color, icon, pady=5, command=None):
         t = self.themes[self.current_theme]
         # Soya/Chegara uchun tashqi ramka
         card_border = tk.Frame(parent, bg="#e2e8f0" if self.current_theme == "light" else "#334155", padx=1, pady=1)
@@ -640,6 +2867,56 @@ class MahallaDasturi:
         info.pack(side="left", padx=(15, 0))
         tk.Label(info, text=title, font=("Segoe UI", int(self.font_size * 0.6), "bold"), fg="#64748b", bg=t["card_bg"]).pack(anchor="w")
         tk.Label(info, text=str(value), font=("Segoe UI", int(self.font_size * 1.2), "bold"), fg=t["text"], bg=t["card_bg"]).pack(anchor="w")
+        
+        if command:
+            stack = [card_border]
+            while stack:
+                w = stack.pop()
+                w.bind("<Button-1>", lambda e: command())
+                w.configure(cursor="hand2")
+                stack.extend(w.winfo_children())
+        return card_border
+
+    def show_duplicates(self):
+        # INN indeksidan (DataManager.inn_index), bazani qayta skanersiz
+        duplicates = self.data_manager.duplicate_groups()
+        
+        if not duplicates:
+            self.show_toast("Dublikatlar topilmadi! Baza toza.")
+            return
+            
+        # Show Window
+        dw = ctk.CTkToplevel(self.root)
+        dw.title(f"Topildi: {len(duplicates)} ta guruh")
+        dw.geometry("600x500")
+        
+        ctk.CTkLabel(dw, text=f"⚠️ {len(duplicates)} ta INN bo'yicha takrorlanishlar topildi", font=("Segoe UI", 16, "bold"), text_color="#e74c3c").pack(pady=10)
+        
+        scroll = ctk.CTkScrollableFrame(dw)
+        scroll.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        for inn, items in duplicates.items():
+            g_frame = ctk.CTkFrame(scroll, fg_color="transparent") # Group
+            g_frame.pack(fill="x", pady=5)
+            
+            ctk.CTkLabel(g_frame, text=f"INN: {inn} ({len(items)} ta)", font=("Segoe UI", 13, "bold")).pack(anchor="w")
+            
+            for it in items:
+                r = ctk.CTkFrame(g_frame, border_width=1, border_color="gray")
+                r.pack(fill="x", padx=10, pady=2)
+                
+                info = f"{it.get('m')} | {it.get('f')}"
+                ctk.CTkLabel(r, text=info, font=("Segoe UI", 12)).pack(side="left", padx=5)
+                
+                # Delete Button per Item
+                def delete_dup(target=it, w=r):
+                     if not self.check_password(): return # Password Protected
+                     if messagebox.askyesno("O'chirish", f"Chindan ham '{target.get('m')}' ni o'chirmoqchimisiz?"):
+                         self.data_manager.move_to_trash(target)
+                         w.destroy()
+                         self.data_manager.log_activity(self.current_role, "Dublikat O'chirildi", f"{target.get('m')}")
+                
+                ctk.CTkButton(r, text="🗑", width=30, height=30, fg_color="#c0392b", command=delete_dup).pack(side="right", padx=5, pady=2)
 
     def create_grid_card(self, parent, title, value, color, icon, row, col):
         t = self.themes[self.current_theme]
@@ -677,7 +2954,100 @@ class MahallaDasturi:
         card.grid(row=row, column=col, sticky="nsew", padx=5, pady=5)
         return card
 
+    def show_roster(self):
+        # Mahallalar kesimi: har MFY bitta qator, har lavozim alohida ustun, bo'sh lavozimlar belgilanadi
+        if not self.data_ready: return self.wait_for_data(self.show_roster)
+        self.clear_content()
+        self.current_view = "roster"
+        rows = self.data_manager.roster_rows()
+        gaps = sum(1 for r in rows if r["gaps"])
+
+        ctk.CTkLabel(self.content_area, text="Mahallalar kesimi", font=("Segoe UI", int(self.font_size * 1.7), "bold"), text_color=("#2c3e50", "#ecf0f1")).pack(anchor="w", padx=30, pady=20)
+        ctk.CTkLabel(self.content_area, text=f"{len(rows)} ta mahalla, {gaps} tasida xodim yetishmaydi. Katakni ikki marta bosib tahrirlang", font=("Segoe UI", int(self.font_size * 0.8)), text_color="gray").pack(anchor="w", padx=35)
+
+        tree_frame = ctk.CTkFrame(self.content_area)
+        tree_frame.pack(fill="both", expand=True, padx=30, pady=(10, 20))
+
+        self.update_treeview_style()
+        roles = (MAHALLA_CATEGORY, *MAHALLA_ROLES)
+        cols = ("no", "m", "inn", *(f"r{n}" for n in range(len(roles))), "gaps")
+        self.roster_tree = ttk.Treeview(tree_frame, columns=cols, show="headings")
+        self.roster_tree.heading("no", text="№"); self.roster_tree.column("no", width=40, anchor="center", stretch=False)
+        self.roster_tree.heading("m", text="Mahalla"); self.roster_tree.column("m", width=200)
+        self.roster_tree.heading("inn", text="INN"); self.roster_tree.column("inn", width=100)
+        for n, role in enumerate(roles):
+            self.roster_tree.heading(f"r{n}", text="Rais" if role == MAHALLA_CATEGORY else role)
+            self.roster_tree.column(f"r{n}", width=160)
+        self.roster_tree.heading("gaps", text="Yetishmaydi"); self.roster_tree.column("gaps", width=160)
+        self.roster_tree.tag_configure("gap", background="#fde2e2", foreground="#922b21")
+
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.roster_tree.yview)
+        self.roster_tree.configure(yscrollcommand=vsb.set)
+        vsb.pack(side="right", fill="y")
+        self.roster_tree.pack(fill="both", expand=True, padx=5, pady=5)
+
+        self.roster_items = {} # qator -> roster_rows() elementi
+        for n, r in enumerate(rows, 1):
+            cells = [", ".join(str(i.get("f", "")) or "-" for i in r[role]) or "⚠ yo'q" for role in roles]
+            iid = self.roster_tree.insert("", "end", values=(n, r["name"], r["inn"], *cells, ", ".join(r["gaps"])), tags=("gap",) if r["gaps"] else ())
+            self.roster_items[iid] = r
+        self.roster_tree.bind("<Double-1>", self.on_roster_double_click)
+
+        btn_frame = ctk.CTkFrame(self.content_area, fg_color="transparent")
+        btn_frame.pack(fill="x", padx=30, pady=(0, 20))
+        ctk.CTkButton(btn_frame, text="📥 Excel (kesim)", fg_color="#27ae60", height=40, font=("Segoe UI", 12, "bold"), command=lambda: self.export_roster_excel(rows)).pack(side="left", padx=5)
+
+    def on_roster_double_click(self, event):
+        # Lavozim katagi - o'sha xodimni, boshqa ustunlar - mahalla yozuvini tahrirlash
+        iid = self.roster_tree.identify_row(event.y)
+        r = self.roster_items.get(iid)
+        if not r: return
+        col = self.roster_tree.column(self.roster_tree.identify_column(event.x), "id")
+        roles = (MAHALLA_CATEGORY, *MAHALLA_ROLES)
+        items = r[roles[int(col[1:])]] if col.startswith("r") else [r["mahalla"]] if r["mahalla"] else []
+        if not items:
+            self.show_toast("Bu lavozimda xodim yo'q")
+            return
+        if not self.check_password(): return
+        self.open_win("Tahrirlash", items[0])
+
+    def export_roster_excel(self, rows):
+        # Pivot: mahalla x lavozim (F.I.SH va telefon), bo'sh kataklar qizil
+        path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel Files", "*.xlsx")])
+        if not path: return
+        try:
+            wb = openpyxl.Workbook()
+            ws = wb.active; ws.title = "Mahallalar kesimi"
+            roles = (MAHALLA_CATEGORY, *MAHALLA_ROLES)
+            headers = ["№", "Mahalla", "INN"]
+            for role in roles:
+                name = "Rais" if role == MAHALLA_CATEGORY else role
+                headers.extend([name, f"{name} (tel)"])
+            headers.append("Yetishmaydi")
+            ws.append(headers)
+            for cell in ws[1]:
+                cell.font = Font(bold=True, color="FFFFFF")
+                cell.fill = PatternFill(start_color="2c3e50", end_color="2c3e50", fill_type="solid")
+
+            missing = PatternFill(start_color="F8D7DA", end_color="F8D7DA", fill_type="solid")
+            for n, r in enumerate(rows, 1):
+                row = [n, r["name"], r["inn"]]
+                for role in roles:
+                    row.append(", ".join(str(i.get("f", "")) for i in r[role]))
+                    row.append(", ".join(str(i.get("t", "")) for i in r[role]))
+                row.append(", ".join(r["gaps"]))
+                ws.append(row)
+                for k, role in enumerate(roles):
+                    if not r[role]:
+                        for cell in ws[ws.max_row][3 + 2 * k:5 + 2 * k]: cell.fill = missing
+
+            for col in ws.columns:
+                ws.column_dimensions[col[0].column_letter].width = max(len(str(c.value or "")) for c in col) + 2
+            wb.save(path); messagebox.showinfo("OK", f"Excel fayl saqlandi! ({len(rows)} ta mahalla)")
+        except Exception as e: messagebox.showerror("Xato", str(e))
+
     def show_trash(self):
+        if not self.data_ready: return self.wait_for_data(self.show_trash)
         self.clear_content()
         self.current_view = "trash"
         
@@ -700,8 +3070,9 @@ class MahallaDasturi:
         self.trash_tree.pack(fill="both", expand=True, padx=5, pady=5)
         
         # MA'LUMOTLARNI YUKLASH
+        self.trash_rows = {} # qator -> yozuv (nomi bir xil yozuvlar adashmasligi uchun)
         for i in self.data_manager.trash:
-            self.trash_tree.insert("", "end", values=(i.get("m"), i.get("f"), i.get("deleted_at","-")))
+            self.trash_rows[self.trash_tree.insert("", "end", values=(i.get("m"), i.get("f"), i.get("deleted_at","-")))] = i
 
         # AMALLAR
         btn_frame = ctk.CTkFrame(self.content_area, fg_color="transparent")
@@ -713,12 +3084,7 @@ class MahallaDasturi:
     def restore_item(self):
         sel = self.trash_tree.selection()
         if not sel: return
-        for s in sel:
-            v = self.trash_tree.item(s)["values"]
-            # Find in trash by name and director (simple match)
-            item = next((i for i in self.data_manager.trash if i.get("m") == v[0] and i.get("f") == v[1]), None)
-            if item:
-                self.data_manager.restore_from_trash(item)
+        self.data_manager.restore_items_from_trash([self.trash_rows.get(s) for s in sel])
         self.show_trash()
         self.filter_data() # Agar ko'rinib turgan bo'lsa, asosiy jadvalni yangilash
         messagebox.showinfo("OK", "Ma'lumotlar tiklandi!")
@@ -728,16 +3094,11 @@ class MahallaDasturi:
         if not sel: return
         if not messagebox.askyesno("Diqqat", "Rostdan ham butunlay o'chirmoqchimisiz? Qaytarib bo'lmaydi!"): return
         
-        for s in sel:
-            v = self.trash_tree.item(s)["values"]
-            item = next((i for i in self.data_manager.trash if i.get("m") == v[0] and i.get("f") == v[1]), None)
-            if item:
-                self.data_manager.permanent_delete(item)
-        self.show_trash()
-
+        self.data_manager.permanent_delete_items([self.trash_rows.get(s) for s in sel])
         self.show_trash()
 
     def show_settings(self):
+        if not self.data_ready: return self.wait_for_data(self.show_settings)
         # XAVFSIZLIK TEKSHIRUVI
         if not self.check_password(): return
 
@@ -793,6 +3154,7 @@ class MahallaDasturi:
         tab_font = tabs.add("Ko'rinish (Shrift)")
         tab_log = tabs.add("Tarix (Logs)")
         tab_tools = tabs.add("Asboblar (Tools)")
+        tab_backup = tabs.add("Zaxiralar (Backup)")
         
         # --- TAB 1: Categories ---
         # Add Frame
@@ -926,58 +3288,131 @@ class MahallaDasturi:
         
         ctk.CTkLabel(dup_frame, text="🔍 Dublikatlarni Topish (Bir xil INN)", font=("Segoe UI", 14, "bold")).pack(side="left", padx=15, pady=15)
         
-        def find_duplicates():
-            # Scan
-            inn_map = {}
-            for item in self.data:
-                inn = item.get("inn")
-                if inn and inn.isdigit(): # Valid INN only
-                    if inn not in inn_map: inn_map[inn] = []
-                    inn_map[inn].append(item)
-            
-            duplicates = {k:v for k,v in inn_map.items() if len(v) > 1}
-            
-            if not duplicates:
-                self.show_toast("Dublikatlar topilmadi! Baza toza.")
-                return
-                
-            # Show Window
-            dw = ctk.CTkToplevel(self.root)
-            dw.title(f"Topildi: {len(duplicates)} ta guruh")
-            dw.geometry("600x500")
-            
-            ctk.CTkLabel(dw, text=f"⚠️ {len(duplicates)} ta INN bo'yicha takrorlanishlar topildi", font=("Segoe UI", 16, "bold"), text_color="#e74c3c").pack(pady=10)
-            
-            scroll = ctk.CTkScrollableFrame(dw)
-            scroll.pack(fill="both", expand=True, padx=10, pady=10)
-            
-            for inn, items in duplicates.items():
-                g_frame = ctk.CTkFrame(scroll, fg_color="transparent") # Group
-                g_frame.pack(fill="x", pady=5)
-                
-                ctk.CTkLabel(g_frame, text=f"INN: {inn} ({len(items)} ta)", font=("Segoe UI", 13, "bold")).pack(anchor="w")
-                
-                for it in items:
-                    r = ctk.CTkFrame(g_frame, border_width=1, border_color="gray")
-                    r.pack(fill="x", padx=10, pady=2)
-                    
-                    info = f"{it.get('m')} | {it.get('f')}"
-                    ctk.CTkLabel(r, text=info, font=("Segoe UI", 12)).pack(side="left", padx=5)
-                    
-                    # Delete Button per Item
-                    def delete_dup(target=it, w=r):
-                         if messagebox.askyesno("O'chirish", f"Chindan ham '{target.get('m')}' ni o'chirmoqchimisiz?"):
-                             self.data_manager.move_to_trash(target)
-                             self.data.remove(target) # Xotira ro'yxatidan to'g'ridan-to'g'ri o'chirish
-                             w.destroy()
-                             self.data_manager.log_activity(self.current_role, "Dublikat O'chirildi", f"{target.get('m')}")
-                             self.save_data()
-                    
-                    ctk.CTkButton(r, text="🗑", width=30, height=30, fg_color="#c0392b", command=delete_dup).pack(side="right", padx=5, pady=2)
+        ctk.CTkButton(dup_frame, text="Tekshirish", command=self.show_duplicates, font=("Segoe UI", 13), width=150).pack(side="right", padx=15)
 
-        ctk.CTkButton(dup_frame, text="Tekshirish", command=find_duplicates, font=("Segoe UI", 13), width=150).pack(side="right", padx=15)
+        # 2. SQLITE BAZA
+        db_frame = ctk.CTkFrame(tools_frame)
+        db_frame.pack(fill="x", pady=10)
+        
+        ctk.CTkLabel(db_frame, text="🗄 SQLite Baza (Indekslangan)", font=("Segoe UI", 14, "bold")).pack(side="left", padx=15, pady=15)
+        
+        def to_sqlite():
+            if not messagebox.askyesno("SQLite", "Barcha ma'lumotlar SQLite bazaga ko'chirilsinmi?\n\nJSON fayl faqat eksport sifatida saqlanadi."): return
+            try:
+                self.data_manager.migrate_to_sqlite()
+            except Exception as e:
+                logging.error(f"SQLite Import Error: {e}\n{traceback.format_exc()}")
+                messagebox.showerror("Xato", str(e)); return
+            self.data_manager.log_activity(self.current_role, "SQLite Import", f"{len(self.data)} ta yozuv ko'chirildi")
+            self.show_toast("SQLite bazaga o'tildi!")
+            self.show_settings()
+        
+        if self.data_manager.store:
+            ctk.CTkLabel(db_frame, text=f"Faol: {SQLITE_FILE} 🟢", font=("Segoe UI", 13, "bold"), text_color="#2ecc71").pack(side="right", padx=15)
+        else:
+            ctk.CTkButton(db_frame, text="Ko'chirish", command=to_sqlite, font=("Segoe UI", 13), width=150).pack(side="right", padx=15)
+
+        # --- TAB 5: Backups (Zaxiralar) ---
+        self.build_backup_tab(tab_backup)
+
+    def build_backup_tab(self, parent):
+        # Snapshotlar ro'yxati, ikki nusxa orasidagi farq va tiklash
+        live_label = "Joriy ma'lumot (hozirgi)"
+        backups = self.data_manager.list_backups()
+        labels = {lbl: name for name, lbl in backups}
+        
+        top = ctk.CTkFrame(parent, fg_color="transparent")
+        top.pack(fill="x", padx=10, pady=10)
+        
+        ctk.CTkLabel(top, text="Eski:", font=("Segoe UI", 12, "bold")).pack(side="left", padx=(0, 5))
+        old_box = ctk.CTkComboBox(top, values=list(labels) or ["-"], width=240, height=35)
+        old_box.pack(side="left", padx=5)
+        ctk.CTkLabel(top, text="Yangi:", font=("Segoe UI", 12, "bold")).pack(side="left", padx=(15, 5))
+        new_box = ctk.CTkComboBox(top, values=[live_label] + list(labels), width=240, height=35)
+        new_box.pack(side="left", padx=5)
+        new_box.set(live_label)
+        if backups: old_box.set(backups[0][1])
+        
+        lbl_summary = ctk.CTkLabel(parent, text=f"{len(backups)} ta zaxira nusxa", font=("Segoe UI", 12), text_color="gray")
+        lbl_summary.pack(anchor="w", padx=15)
+        
+        tree_frame = ctk.CTkFrame(parent)
+        tree_frame.pack(fill="both", expand=True, padx=10, pady=10)
+        cols = ("kind", "m", "f", "fields")
+        diff_tree = ttk.Treeview(tree_frame, columns=cols, show="headings", height=12)
+        diff_tree.heading("kind", text="Holat"); diff_tree.column("kind", width=130, anchor="center")
+        diff_tree.heading("m", text="Tashkilot Nomi"); diff_tree.column("m", width=250, anchor="w")
+        diff_tree.heading("f", text="F.I.SH"); diff_tree.column("f", width=200, anchor="w")
+        diff_tree.heading("fields", text="O'zgargan maydonlar"); diff_tree.column("fields", width=400, anchor="w")
+        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=diff_tree.yview)
+        vsb.pack(side="right", fill="y")
+        diff_tree.configure(yscrollcommand=vsb.set)
+        diff_tree.pack(fill="both", expand=True)
+        
+        rows = {} # iid -> (turi, eski, yangi)
+        state = {"old": None, "live": False}
+        kinds = {"added": "➕ Qo'shilgan", "removed": "➖ O'chirilgan", "changed": "✏ O'zgargan"}
+        
+        def show_diff():
+            old = labels.get(old_box.get())
+            if not old: return
+            new = None if new_box.get() == live_label else labels.get(new_box.get())
+            t0 = time.perf_counter()
+            try:
+                res = self.data_manager.backups.diff(old, new, live=self.data)
+            except Exception as e:
+                logging.error(f"Diff Error: {e}\n{traceback.format_exc()}")
+                messagebox.showerror("Xato", str(e)); return
+            elapsed = time.perf_counter() - t0
+            
+            diff_tree.delete(*diff_tree.get_children())
+            rows.clear()
+            state["old"], state["live"] = old, new is None
+            for kind in ("removed", "added", "changed"):
+                for entry in res[kind]:
+                    if kind == "changed":
+                        o, n, fields = entry
+                        txt = "; ".join(f"{k}: {'' if v[0] is None else v[0]} → {'' if v[1] is None else v[1]}" for k, v in fields.items())
+                    else:
+                        o, n = (entry, None) if kind == "removed" else (None, entry)
+                        txt = ""
+                    rec = n or o
+                    iid = diff_tree.insert("", "end", values=(kinds[kind], rec.get("m", ""), rec.get("f", ""), txt))
+                    rows[iid] = (kind, o, n)
+            lbl_summary.configure(text=f"➕ {len(res['added'])}   ➖ {len(res['removed'])}   ✏ {len(res['changed'])}   ({elapsed:.2f} s)")
+        
+        def restore_all():
+            old = labels.get(old_box.get())
+            if not old: return
+            if not messagebox.askyesno("Tiklash", f"Butun baza '{old_box.get()}' holatiga qaytarilsinmi?\n\nJoriy holat avval zaxiralanadi."): return
+            n = self.data_manager.restore_snapshot(old)
+            self.data_manager.log_activity(self.current_role, "Zaxiradan Tiklandi", f"{old_box.get()} ({n} ta yozuv)")
+            self.filtered_data = self.data[:]
+            self.sync_background()
+            self.show_toast(f"Tiklandi: {n} ta yozuv")
+            show_diff()
+        
+        def restore_selected():
+            if not state["live"]:
+                messagebox.showerror("Tiklash", "Tanlab tiklash uchun 'Yangi' tomonda joriy ma'lumot bo'lishi kerak."); return
+            entries = [rows[s] for s in diff_tree.selection() if s in rows]
+            if not entries: return
+            if not messagebox.askyesno("Tiklash", f"{len(entries)} ta yozuv zaxiradagi holatiga qaytarilsinmi?"): return
+            n = self.data_manager.restore_records(entries)
+            self.data_manager.log_activity(self.current_role, "Zaxiradan Tiklandi", f"{n} ta yozuv ({old_box.get()})")
+            self.sync_background()
+            self.show_toast(f"Tiklandi: {n} ta yozuv")
+            show_diff()
+        
+        ctk.CTkButton(top, text="🔍 Farqni ko'rish", command=show_diff, height=35, width=140).pack(side="left", padx=10)
+        
+        btns = ctk.CTkFrame(parent, fg_color="transparent")
+        btns.pack(fill="x", padx=10, pady=(0, 10))
+        ctk.CTkButton(btns, text="♻ Tanlanganlarni tiklash", command=restore_selected, fg_color="#27ae60", height=40, font=("Segoe UI", 12, "bold")).pack(side="left", padx=5)
+        ctk.CTkButton(btns, text="♻ Butun zaxirani tiklash", command=restore_all, fg_color="#c0392b", hover_color="#a93226", height=40, font=("Segoe UI", 12, "bold")).pack(side="left", padx=5)
 
     def show_table(self):
+        if not self.data_ready: return self.wait_for_data(self.show_table)
         self.clear_content()
         self.current_view = "table"
         
@@ -993,13 +3428,13 @@ class MahallaDasturi:
         search_frame.pack(side="left", fill="x")
 
         # Filtrlash Turi
-        self.f_type = ctk.CTkComboBox(search_frame, values=["Nomi", "F.I.SH", "INN", "Izoh"], width=120, height=40, font=("Segoe UI", 12))
+        self.f_type = ctk.CTkComboBox(search_frame, values=["Nomi", "F.I.SH", "Tel", "INN", "Izoh", *self.data_manager.settings.get("custom_columns", [])], width=120, height=40, font=("Segoe UI", 12))
         self.f_type.set("Nomi")
         self.f_type.pack(side="left", padx=(0, 10))
         # CTk ComboBox command logic if needed (or just query it)
 
         # Qidiruv maydoni
-        self.s_var = tk.StringVar(); self.s_var.trace("w", self.filter_data)
+        self.s_var = tk.StringVar(); self.s_var.trace("w", self.schedule_search)
         
         search_entry = ctk.CTkEntry(search_frame, textvariable=self.s_var, width=300, height=40, font=("Segoe UI", 14), placeholder_text="Qidiruv...")
         search_entry.pack(side="left", padx=5)
@@ -1072,9 +3507,10 @@ class MahallaDasturi:
         hsb = ttk.Scrollbar(tree_frame, orient="horizontal")
 
         # JADVAL Sarlavhalari
-        self.tree = ttk.Treeview(tree_frame, columns=[], show="headings", yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree = ttk.Treeview(tree_frame, columns=[], show="headings", xscrollcommand=hsb.set,
+                                 yscrollcommand=lambda first, last: self.on_tree_scroll(vsb, first, last))
         
-        vsb.configure(command=self.tree.yview)
+        vsb.configure(command=self.table_yview) # Aylantirish paneli butun filtrlangan ro'yxat bo'yicha
         hsb.configure(command=self.tree.xview)
 
         vsb.pack(side="right", fill="y")
@@ -1107,6 +3543,13 @@ class MahallaDasturi:
         self.tree.bind("<Double-1>", self.on_double_click_cell) # Changed to generic cell handler
         self.tree.bind("<Return>", self.edit_comment_inline) # Keep enter for legacy quick edit
 
+        # Virtual jadval: tanlov/fokus modelda saqlanadi, sahifalash va o'lcham o'zgarishi oynani qayta bog'laydi
+        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        for seq in ("<Button-1>", "<Up>", "<Down>"): self.tree.bind(seq, self.on_tree_press)
+        self.tree.bind("<Prior>", lambda e: self.table_yview("scroll", -1, "pages") or "break")
+        self.tree.bind("<Next>", lambda e: self.table_yview("scroll", 1, "pages") or "break")
+        self.tree.bind("<Configure>", lambda e: self.schedule_rebind())
+
         # PASTKI RAMKA (Jami hisobi)
         footer = ctk.CTkFrame(self.content_area, fg_color="transparent", height=30)
         footer.pack(fill="x", padx=30, pady=(0, 10))
@@ -1160,6 +3603,7 @@ class MahallaDasturi:
             if old_name in item:
                 item[new_name] = item.pop(old_name)
         self.data_manager.save_data()
+        self.data_manager.rebuild_search()
         
         self.show_table()
         self.show_toast("O'zgartirildi!")
@@ -1176,6 +3620,7 @@ class MahallaDasturi:
         for item in self.data:
             if name in item: del item[name]
         self.data_manager.save_data()
+        self.data_manager.rebuild_search()
         
         self.show_table()
         self.show_toast("O'chirildi!")
@@ -1225,6 +3670,7 @@ class MahallaDasturi:
             
         self.data_manager.settings["custom_columns"].append(new_col)
         self.data_manager.save_settings()
+        self.data_manager.rebuild_search()
         self.show_table() # Refresh table
         self.show_toast(f"'{new_col}' ustuni qo'shildi!")
         self.sync_background()
@@ -1247,7 +3693,7 @@ class MahallaDasturi:
 
     def edit_cell(self, col_name):
         # Generic cell editor
-        sel = self.tree.focus()
+        sel = self.table_focus_row() # Aylantirib oynadan chiqarilgan bo'lsa ham
         if not sel: return
         self.tree.see(sel)
         self.root.update_idletasks()
@@ -1279,22 +3725,20 @@ class MahallaDasturi:
         def save(event):
             new_txt = entry.get()
             
-            # Update UI
-            cur_vals = list(self.tree.item(sel)["values"])
-            cur_vals[col_idx] = new_txt
-            self.tree.item(sel, values=cur_vals)
+            # Update UI (tahrir paytida jadval aylantirilgan bo'lsa, qator oynada bo'lmasligi mumkin)
+            if self.tree.exists(sel):
+                cur_vals = list(self.tree.item(sel)["values"])
+                cur_vals[col_idx] = new_txt
+                self.tree.item(sel, values=cur_vals)
             
             # Update Data
-            inn = str(cur_vals[5]) # INN is always at 5 (num=0, s=1, m=2, f=3, t=4, inn=5)
-            # Find item
-            item = next((i for i in self.data if str(i.get("inn")) == inn), None)
+            item = self.data_manager.get(sel) # Qator iid = yozuv uuid
             if item:
                 if col_name == "izoh":
-                    item["izoh"] = new_txt
+                    self.data_manager.update_item(item, {"izoh": new_txt})
                 elif col_name.startswith("custom_"):
                     real_key = col_name.replace("custom_", "")
-                    item[real_key] = new_txt
-                self.data_manager.save_data()
+                    self.data_manager.update_item(item, {real_key: new_txt})
             
             entry.destroy()
             try: self.tree.focus_set()
@@ -1564,9 +4008,7 @@ class MahallaDasturi:
                          
                     new_db.append(item)
                 
-                self.data = new_db
-                self.data_manager.data = self.data
-                self.save_data()
+                self.data_manager.replace_data(new_db)
                 self.filter_data()
                 if not silent: messagebox.showinfo("OK", "Ma'lumotlar Google Sheetdan yuklab olindi!")
 
@@ -1587,83 +4029,322 @@ class MahallaDasturi:
         self.edit_item()
 
     def sort_treeview(self, col, reverse):
-        l = [(self.tree.set(k, col), k) for k in self.tree.get_children('')]
-        try:
-            # Try numeric sort if possible
-            l.sort(key=lambda t: int(t[0]), reverse=reverse)
-        except ValueError:
-            l.sort(reverse=reverse)
-
-        for index, (val, k) in enumerate(l):
-            self.tree.move(k, '', index)
+        # Jadvalda faqat bir qismi chizilgan bo'lishi mumkin: butun filtrlangan ro'yxat saralanadi
+        if col == "num":
+            # № - qatorlar har chizishda qayta raqamlanadi: bazadagi asl o'rni bo'yicha saralanadi
+            pos = {id(i): n for n, i in enumerate(self.data)}
+            self.filtered_data.sort(key=lambda i: pos.get(id(i), len(pos)), reverse=reverse)
+        else:
+            field = col.replace("custom_", "", 1)
+            l = [(str(i.get(field, "")), i) for i in self.filtered_data]
+            try:
+                # Try numeric sort if possible
+                l.sort(key=lambda t: int(t[0]), reverse=reverse)
+            except ValueError:
+                l.sort(key=lambda t: t[0], reverse=reverse)
+            self.filtered_data[:] = [i for v, i in l]
+        self.update_table(self.filtered_data, keep_scroll=False) # Saralangandan keyin - boshidan
 
         self.tree.heading(col, command=lambda: self.sort_treeview(col, not reverse))
 
 
     def filter_data(self, *args):
+        # Darhol (UI oqimida) qidirish: tahrir/o'chirishdan keyin jadval shu zahoti yangilanadi
         if self.current_view != "table": return
+        self.cancel_search()
         q = self.s_var.get().lower().strip() # Added strip()
-        cat = self.cat_var.get()
-        tp = self.f_type.get()
-        
-        
-        res = []
+        res = self.search_results(q, self.cat_var.get(), self.f_type.get(), self.data, version=self.data_manager.version)
+        self.filtered_data = res
+        self.update_table(res)
 
-        for i in self.data:
-            n = str(i.get("m", "")).lower()
-            # Dynamic Filter Logic (Strict + Legacy Support)
-            s_val = str(i.get("s", "")).strip()
-            
-            # 1. Exact Match (Primary for New Categories)
-            is_match = (s_val == cat)
-            
-            # 2. Legacy Support for Renamed Core Categories
-            if not is_match:
-                if cat == "Mahalla (MFY)" and s_val in ["Mahalla", "MFY"]: is_match = True
-                elif cat == "Maktab" and s_val in ["Maktablar"]: is_match = True
-                elif cat == "Bog'cha (MTT)" and s_val in ["MTT", "Bog'cha"]: is_match = True
-            
-            match_cat = (cat == "Barchasi") or is_match
-             
-            if match_cat:
-                target = ""
-                if tp == "Nomi": target = n
-                elif tp == "F.I.SH": target = str(i.get("f","")).lower()
-                elif tp == "INN": target = str(i.get("inn",""))
-                elif tp == "Izoh": target = str(i.get("izoh","")).lower()
-                
-                # Check for substring match
-                if q in target: res.append(i)
-                
+    def search_results(self, q, cat, tp, data, gen=None, version=None):
+        # gen berilsa (fon qidiruvi), yangiroq qidiruv boshlanganda None qaytaradi.
+        # version - data qaysi ma'lumot versiyasiga tegishli (kesh kaliti)
+        cache = self.filter_cache
+        field = {"Nomi": "m", "F.I.SH": "f", "Tel": "t", "INN": "inn", "Izoh": "izoh"}.get(tp, tp)
+        fuzzy = q.startswith("~") and q[1:].strip()
+        terms = None if fuzzy else parse_query(q, field, self.data_manager.settings.get("custom_columns", []))
+        ranked = q and terms is None and not fuzzy and field != "t" # Telefon: raqam oxiri bo'yicha, saralanmaydi
+        res = cache.get(q, cat, tp, version)
+        if res is not None: return self.rank_results(res, q, field) if ranked else res[:]
+        
+        hits = base = None
+        if fuzzy:
+            # "~Xoldaraliyevich": 1-2 harf xato bilan, eng yaqinlari birinchi (indeks tayyor bo'lmasa - oddiy qidiruv)
+            hits = self.data_manager.fuzzy_records(fuzzy, field)
+            match = self.row_filter(fuzzy, cat, tp if field in FUZZY_FIELDS else "Nomi")
+        elif terms is not None:
+            # Maydonli so'rov (turi:Maktab -f:Ismoilov ...): indeks nomzodlari yoki butun ro'yxat tekshiriladi
+            rows, test = self.data_manager.query_plan(terms, cat)
+            if rows is not None: data = rows
+            match = test if cat == "Barchasi" else lambda i: i.get("s") == cat and test(i)
+        else:
+            # Trigram indeks (3+ belgi); aks holda keshdagi prefiks natijasi yoki butun ro'yxat bo'ylab oddiy qidiruv
+            hits = self.data_manager.search_records(search_key(q), field)
+            base = cache.base(q, cat, tp, version) if hits is None else None
+            match = self.row_filter(q, cat, tp)
+            if hits is None and base is None and cat != "Barchasi":
+                # Kategoriya tabi: butun baza emas, faqat shu kategoriya yozuvlari ko'riladi
+                rows = self.data_manager.category_records(cat)
+                if rows is not None: data = rows
+        if hits is not None:
+            res = hits if cat == "Barchasi" else [i for i in hits if i.get("s") == cat]
+        elif base is not None:
+            # Prefiks natijasini toraytirish: "mahal" ga mos har yozuv "mah" ga ham mos
+            prefix, base_cat, items = base
+            if prefix == q: res = [i for i in items if i.get("s") == cat]
+            else: res = list(filter(match, items))
+        else:
+            res = []
+            for start in range(0, len(data), SEARCH_SCAN_CHUNK):
+                if gen is not None and gen != self.search_gen: return None
+                res.extend(filter(match, data[start:start + SEARCH_SCAN_CHUNK]))
+        # Keshda jadval tartibida (prefiksdan toraytirish uchun); oddiy so'rov natijasi mosligi bo'yicha saralanadi.
+        # Nusxa: jadval ro'yxati (refresh_rows) keshni buzmasligi uchun
+        cache.put(q, cat, tp, version, res, terms is None and not fuzzy and field != "t")
+        return self.rank_results(res, q, field) if ranked else res[:]
+
+    def rank_results(self, res, q, field):
+        # Mosligi bo'yicha: aniq INN, maydon shu so'z bilan boshlanadi, biror so'zi shu bilan boshlanadi,
+        # qolganlari. Daraja 4 ta - bir o'tishda guruhlash (har guruh ichida jadval tartibi)
+        key = search_key(q)
+        field_key = self.data_manager.derived.key
+        word_start = re.compile(r"(?<!\w)" + re.escape(key))
+        tiers = ([], [], [], [])
+        for i in res:
+            text = field_key(i, field)
+            if q == str(i.get("inn", "")): tiers[0].append(i)
+            elif text.startswith(key): tiers[1].append(i)
+            elif word_start.search(text): tiers[2].append(i)
+            else: tiers[3].append(i)
+        return [*tiers[0], *tiers[1], *tiers[2], *tiers[3]]
+
+    def schedule_search(self, *args):
+        # Har harfda emas: yozish to'xtagach bitta qidiruv (debounce)
+        if self.search_after: self.root.after_cancel(self.search_after)
+        self.search_after = self.root.after(SEARCH_DEBOUNCE_MS, self.start_search)
+
+    def cancel_search(self):
+        if self.search_after:
+            self.root.after_cancel(self.search_after)
+            self.search_after = None
+        self.search_gen += 1 # Fondagi eski qidiruv to'xtaydi, natijasi tashlanadi
+        self.search_pending = None
+
+    def start_search(self):
+        self.search_after = None
+        if self.current_view != "table": return
+        self.search_gen += 1
+        self.search_pending = self.search_gen
+        # Qidiruv parametrlari va ro'yxat nusxasi UI oqimida olinadi
+        self.search_jobs.put((self.search_gen, self.s_var.get().lower().strip(), self.cat_var.get(), self.f_type.get(),
+                              self.data[:], self.data_manager.version))
+
+    def search_busy(self):
+        return self.search_after is not None or self.search_pending is not None
+
+    def search_worker(self):
+        while True:
+            job = self.search_jobs.get()
+            while not self.search_jobs.empty(): job = self.search_jobs.get() # Faqat eng oxirgisi
+            gen, q, cat, tp, data, version = job
+            if gen != self.search_gen: continue
+            try:
+                res = self.search_results(q, cat, tp, data, gen, version)
+            except Exception as e:
+                logging.error(f"Qidiruv xatosi: {e}\n{traceback.format_exc()}")
+                res = False # UI oqimida oddiy qidiruv bilan qayta urinish
+            if res is not None: self.ui_queue.put(lambda g=gen, r=res: self.apply_search(g, r))
+
+    def apply_search(self, gen, res):
+        # Faqat eng yangi qidiruv natijasi qo'yiladi
+        if gen != self.search_gen or self.current_view != "table": return
+        self.search_pending = None
+        if res is False: return self.filter_data()
         self.filtered_data = res
         self.update_table(res)
 
-    def update_table(self, d_list):
-        for r in self.tree.get_children(): self.tree.delete(r)
-        
-        # Respecting current sort would be ideal, but simply appending matches user expectations for "Filtered View"
-        for idx, i in enumerate(d_list, 1):
-            values = [
-                str(idx), # Number
-                i.get("s","-"), i.get("m","-"), i.get("f","-"), 
-                i.get("t","-"), i.get("inn","-"), i.get("izoh", "")
-            ]
-            
-            # Add custom column values dynamically
-            for cc in self.data_manager.settings.get("custom_columns", []):
-                values.append(i.get(cc, ""))
-                
-            self.tree.insert("", "end", values=values)
+    def row_filter(self, q=None, cat=None, tp=None):
+        # Joriy qidiruv/kategoriya bo'yicha bitta yozuvni tekshiruvchi funksiya
+        if q is None: q = self.s_var.get().lower().strip()
+        if cat is None: cat = self.cat_var.get()
+        if tp is None: tp = self.f_type.get()
+        q = search_key(q) # "Qo'shtepa" = "Qoʻshtepa" = "Қўштепа"
+        entry, field_key = self.data_manager.derived.entry, self.data_manager.derived.key # Qidiruv kalitlari keshdan
+        field = {"Nomi": 0, "F.I.SH": 1, "Izoh": 2}.get(tp)
+        phone = phone_query(q) if tp == "Tel" else ""
+
+        def match(i):
+            # Kategoriyalar yuklashda migratsiya qilingan (CATEGORY_ALIASES): oddiy tenglik
+            if cat != "Barchasi" and i.get("s") != cat: return False
+            target = ""
+            if field is not None: target = entry(i)[field]
+            elif tp == "INN": target = field_key(i, "inn")
+            elif tp == "Tel": return phone_match(entry(i)[3], phone) # Raqam oxiri (+998 siz)
+            elif tp: target = field_key(i, tp) # Qo'shimcha ustun
+            return q in target
+        return match
+
+    def update_table(self, d_list, keep_scroll=True):
+        # Virtual jadval: Treeview da faqat ko'rinib turgan qatorlar (+ TABLE_OVERSCAN) bor, aylantirilganda
+        # ular filtered_data ning boshqa qismiga qayta bog'lanadi. Chizish narxi natija soniga bog'liq emas.
+        # Yangi natijada ekrandagi birinchi (yoki undan keyingi) yozuv o'z joyida, tanlangan yozuvlar tanlangan qoladi
+        self.on_tree_select()
+        children = self.tree.get_children()
+        start = round(self.tree.yview()[0] * len(children)) if children else 0
+        screen = {u: k for k, u in enumerate(children[start:])} if keep_scroll else {}
+        selected, keep, top, best = self.table_selected, set(), 0, None
+        for idx, i in enumerate(d_list):
+            u = i["uuid"]
+            if u in selected: keep.add(u)
+            k = screen.get(u)
+            if k is not None and (best is None or k < best): top, best = idx - k, k
+        if not keep and d_list: keep = {d_list[0]["uuid"]} # Klaviatura uchun birinchi qator tanlanadi
+        self.table_selected = keep
+        if self.table_focus not in keep: self.table_focus = next((i["uuid"] for i in d_list if i["uuid"] in keep), None)
+        self.render_window(top)
         
         # Update Counter
         if hasattr(self, "lbl_count"):
              self.lbl_count.configure(text=f"Jami: {len(d_list)} ta")
+
+    def table_page(self):
+        # Ekranga sig'adigan qatorlar soni (jadval hali joylashmagan bo'lsa - TABLE_MIN_ROWS)
+        height = self.tree.winfo_height()
+        if height <= 1: return TABLE_MIN_ROWS
+        try: row = int(self.style.lookup("Treeview", "rowheight") or 0)
+        except ValueError: row = 0
+        return height // (row or int(self.font_size * 2.5)) + 1
+
+    def render_window(self, top):
+        # top - ekranning birinchi qatori (filtered_data dagi o'rni). Chiziladi: [top - overscan, top + sahifa + overscan)
+        if not self.tree.winfo_exists(): return
+        d_list, page = self.filtered_data, self.table_page()
+        top = max(0, min(top, len(d_list) - page))
+        lo, hi = max(0, top - TABLE_OVERSCAN), min(len(d_list), top + page + TABLE_OVERSCAN)
+        custom_cols = self.data_manager.settings.get("custom_columns", [])
+        # Mavjud qatorlar bilan solishtiriladi: oynadan chiqqanlari o'chiriladi, qolganlari joyiga suriladi,
+        # qiymati o'zgarganlari yangilanadi, yangilari qo'shiladi (hammasini o'chirib qayta qo'yish o'rniga)
+        want = [d_list[idx]["uuid"] for idx in range(lo, hi)]
+        wanted, cached = set(want), self.table_values
+        children = self.tree.get_children()
+        gone = [u for u in children if u not in wanted]
+        if gone: self.tree.delete(*gone)
+        current = [u for u in children if u in wanted]
+        values = {}
+        for pos, u in enumerate(want):
+            values[u] = row = self.row_values(lo + pos + 1, d_list[lo + pos], custom_cols)
+            if pos < len(current) and current[pos] == u:
+                if cached.get(u) != row: self.tree.item(u, values=row)
+            elif u in current:
+                self.tree.move(u, "", pos)
+                current.remove(u); current.insert(pos, u)
+                if cached.get(u) != row: self.tree.item(u, values=row)
+            else:
+                self.tree.insert("", pos, iid=u, values=row)
+                current.insert(pos, u)
+        self.table_values = values
+        self.table_lo, self.table_hi = lo, hi
+        sel = [u for u in want if u in self.table_selected]
+        if set(sel) != set(self.tree.selection()): self.tree.selection_set(sel)
+        if self.table_focus and self.tree.exists(self.table_focus) and self.tree.focus() != self.table_focus: self.tree.focus(self.table_focus)
+        if hi > lo: self.tree.yview_moveto((top - lo) / (hi - lo))
+
+    def visible_top(self):
+        return self.table_lo + round(self.tree.yview()[0] * (self.table_hi - self.table_lo))
+
+    def on_tree_scroll(self, vsb, first, last):
+        # Treeview oyna ichida o'zi aylanadi; panel esa butun ro'yxatdagi o'rinni ko'rsatadi
+        lo, hi, n = self.table_lo, self.table_hi, len(self.filtered_data)
+        top, bottom = lo + float(first) * (hi - lo), lo + float(last) * (hi - lo)
+        if n: vsb.set(top / n, bottom / n)
+        else: vsb.set(0, 1)
+        # Oyna chetiga yaqinlashganda qatorlar joriy o'ringa qayta bog'lanadi
+        margin = TABLE_OVERSCAN // 2
+        if (lo > 0 and top - lo < margin) or (hi < n and hi - bottom < margin): self.schedule_rebind()
+
+    def schedule_rebind(self):
+        if self.table_rebind: return
+        self.table_rebind = True
+        self.root.after_idle(self.rebind_rows)
+
+    def rebind_rows(self):
+        self.table_rebind = False
+        if self.current_view == "table" and self.tree.winfo_exists(): self.render_window(self.visible_top())
+
+    def table_yview(self, *args):
+        # Aylantirish paneli / sahifalash: "moveto 0.3" yoki "scroll 1 pages|units"
+        top, n = self.visible_top(), len(self.filtered_data)
+        if args[0] == "moveto": top = int(float(args[1]) * n)
+        elif args[0] == "scroll": top += int(args[1]) * (self.table_page() - 1 if args[2] == "pages" else 1)
+        self.render_window(top)
+
+    def on_tree_select(self, event=None):
+        # Oynadagi tanlov modelga ko'chiriladi; oynadan tashqaridagi tanlangan yozuvlar saqlanib qoladi
+        self.table_selected.difference_update(self.tree.get_children())
+        self.table_selected.update(self.tree.selection())
+        if self.tree.focus(): self.table_focus = self.tree.focus()
+
+    def on_tree_press(self, event):
+        # Shift/Ctrl siz bosish yoki strelka - avvalgi tanlov (oynadan tashqaridagisi ham) bekor bo'ladi
+        if event.state & 0x0005: return
+        if event.type == tk.EventType.ButtonPress and self.tree.identify_region(event.x, event.y) not in ("cell", "tree"): return
+        self.table_selected.clear()
+
+    def table_selection(self):
+        # Tanlangan yozuvlar uuid lari (jadval tartibida, aylantirib yashirilganlari ham)
+        self.on_tree_select()
+        return [i["uuid"] for i in self.filtered_data if i["uuid"] in self.table_selected]
+
+    def table_focus_row(self):
+        # Fokusdagi qator iid; aylantirib oynadan chiqarilgan bo'lsa, o'sha joy qayta chiziladi
+        u = self.tree.focus() or self.table_focus
+        if u and not self.tree.exists(u):
+            idx = next((n for n, i in enumerate(self.filtered_data) if i["uuid"] == u), None)
+            if idx is None: return ""
+            self.render_window(idx)
+        return u or ""
+
+    def row_values(self, n, i, custom_cols=None):
+        if custom_cols is None: custom_cols = self.data_manager.settings.get("custom_columns", [])
+        values = [
+            str(n), # Number
+            i.get("s","-"), i.get("m","-"), i.get("f","-"), 
+            i.get("t","-"), i.get("inn","-"), i.get("izoh", "")
+        ]
         
-        # Set focus to top item for keyboard nav
-        if self.tree.get_children():
-            first = self.tree.get_children()[0]
-            self.tree.selection_set(first)
-            self.tree.focus(first)
+        # Add custom column values dynamically
+        for cc in custom_cols:
+            values.append(i.get(cc, ""))
+        return values
+
+    def refresh_rows(self, changes):
+        # Boshqa nusxadan kelgan o'zgarishlar filtered_data ga qo'llanadi, so'ng faqat ko'rinib turgan oyna qayta chiziladi
+        if self.search_busy():
+            return self.filter_data() # Fonda qidiruv ketmoqda
+        q = self.s_var.get().lower().strip()
+        if q.startswith("~") or parse_query(q, "m") is not None:
+            return self.filter_data() # Maydonli/taxminiy so'rov: tartib va shartlar row_filter dan boshqacha
+        listed = None
+        match = self.row_filter()
+        final = {} # Bir yozuvga bir nechta o'zgarish kelsa, bittaga birlashtiriladi
+        for kind, item in changes:
+            prev = final.get(id(item))
+            final[id(item)] = (prev[0] if prev and kind == "set" else kind, item)
+        removed = set()
+        for kind, item in final.values():
+            if kind == "del" or not match(item):
+                removed.add(id(item))
+                self.table_selected.discard(item["uuid"])
+            elif not self.tree.exists(item["uuid"]):
+                # Oynadan tashqarida bo'lsa, o'sha joyda qoladi; yangi mos yozuv oxiriga qo'shiladi
+                if listed is None: listed = {id(i) for i in self.filtered_data}
+                if id(item) not in listed: self.filtered_data.append(item)
+        if removed:
+            self.filtered_data[:] = [i for i in self.filtered_data if id(i) not in removed]
+        self.render_window(self.visible_top())
+        if hasattr(self, "lbl_count"):
+            self.lbl_count.configure(text=f"Jami: {len(self.filtered_data)} ta")
 
     # --- PRO FUNKSIYALAR ---
 
@@ -1749,9 +4430,9 @@ class MahallaDasturi:
         try:
             r = requests.get(f"https://api.github.com/gists/{gist_id}")
             if r.status_code == 200:
-                self.data = json.loads(r.json()['files']['mahalla_bazasi.json']['content'])
-                self.data_manager.data = self.data # Update manager data
-                self.save_data(); self.filter_data()
+                version, records = unwrap_db(json.loads(r.json()['files']['mahalla_bazasi.json']['content']))
+                self.data_manager.replace_data(records, version)
+                self.filter_data()
                 messagebox.showinfo("OK", "Baza yangilandi!")
             else: messagebox.showerror("Xato", "Baza topilmadi!")
         except Exception as e: messagebox.showerror("Xato", str(e))
@@ -1818,10 +4499,9 @@ class MahallaDasturi:
 
     def edit_item(self):
         if not self.check_password(): return # Password Protected
-        sel = self.tree.focus()
+        sel = self.table_focus_row()
         if sel:
-            v = self.tree.item(sel)["values"]
-            item = next((i for i in self.data if i.get("inn") == str(v[5])), None) # INN is at index 5 now
+            item = self.data_manager.get(sel) # Qator iid = yozuv uuid
             if item: self.open_win("Tahrirlash", item)
 
     def add_item(self): 
@@ -1896,6 +4576,10 @@ class MahallaDasturi:
              # CTkEntry events are usually passed through.
              widgets["t"].bind("<KeyRelease>", self.format_phone_input)
         
+        # Avto-to'ldirish: mavjud nomlar va F.I.SH lardan (bir xil yozilishi uchun)
+        for key in ("m", "f", *[k for k, _, _, _ in form_config if k.startswith("custom_")]):
+            self.attach_autocomplete(container, widgets[key], key.replace("custom_", "", 1))
+        
         def save():
             # VALIDATION
             val_inn = widgets["inn"].get()
@@ -1911,7 +4595,7 @@ class MahallaDasturi:
                 # Find any other item with same INN
                 # If editing (item is not None), ignore self
                 # item.get('inn') is the old INN
-                exists = next((x for x in self.data if x.get("inn") == val_inn and x != item), None)
+                exists = next((x for x in self.data_manager.find_by_inn(val_inn) if x.get("uuid") != (item or {}).get("uuid")), None)
                 if exists:
                     msg = f"DIQQAT: Bu INN ({val_inn}) allaqachon mavjud!\n\nTashkilot: {exists.get('m')}\nRahbar: {exists.get('f')}\n\nBaribir saqlansinmi?"
                     if not messagebox.askyesno("Dublikat Topildi", msg):
@@ -1926,23 +4610,17 @@ class MahallaDasturi:
                  else:
                      d[key] = val
             
+            # 2. Persist (jurnal orqali, faqat o'zgargan maydonlar)
             if item: 
-                # Preserve UUID if editing
-                d["uuid"] = item.get("uuid", "")
-                # Update existing dict in list (to keep ref?) NO, replace dict
-                # But wait, self.data[idx] = d works.
-                idx = self.data.index(item)
-                self.data[idx] = d
-                
+                # Mavjud yozuv joyida yangilanadi (UUID saqlanib qoladi)
+                self.data_manager.update_item(item, d)
                 self.data_manager.log_activity(self.current_role, "Tahrirlash", f"{d.get('m')} yangilandi")
             else: 
-                d["uuid"] = str(uuid.uuid4()) # Generate new UUID
-                self.data.append(d)
+                self.data_manager.add_item(d) # Yangi UUID beriladi
                 self.data_manager.log_activity(self.current_role, "Qo'shish", f"{d.get('m')} yangi qo'shildi")
             
-            # 3. Persist
-            self.save_data() 
             self.filter_data()
+            if self.current_view == "roster": self.show_roster()
             self.sync_background() # Auto Sync Trigger
             win.destroy()
             self.show_toast("Saqlandi!")
@@ -1955,6 +4633,50 @@ class MahallaDasturi:
         
         ctk.CTkButton(win, text="SAQLASH", command=save, height=50, font=("Segoe UI", 14, "bold"), fg_color="#27ae60", hover_color="#2ecc71").pack(fill="x", padx=40, pady=20)
 
+    def attach_autocomplete(self, container, entry, field):
+        # Maydon ostida tavsiyalar ro'yxati: Pastga - ro'yxatga o'tish, Enter/ikki marta bosish - tanlash, Esc - yopish
+        lb = tk.Listbox(container, height=COMPLETION_LIMIT, font=("Segoe UI", 12), activestyle="none",
+                        exportselection=False)
+
+        def hide(event=None):
+            lb.place_forget()
+
+        def pick(event=None):
+            sel = lb.curselection()
+            if not sel: return
+            entry.delete(0, tk.END)
+            entry.insert(0, lb.get(sel[0]))
+            hide()
+            entry.focus_set()
+            return "break"
+
+        def on_key(event):
+            if event.keysym in ("Down", "Up", "Return", "Escape", "Tab"): return
+            values = self.data_manager.completions.suggest(field, entry.get())
+            if not values: return hide()
+            lb.delete(0, tk.END)
+            for v in values: lb.insert(tk.END, v)
+            lb.configure(height=len(values))
+            lb.place(in_=entry, relx=0, rely=1, relwidth=1)
+            lb.lift()
+
+        def on_down(event):
+            if not lb.winfo_ismapped(): return
+            lb.focus_set()
+            lb.selection_clear(0, tk.END)
+            lb.selection_set(0)
+            lb.activate(0)
+            return "break"
+
+        entry.bind("<KeyRelease>", on_key, add="+")
+        entry.bind("<Down>", on_down, add="+")
+        entry.bind("<Escape>", hide, add="+")
+        entry.bind("<FocusOut>", lambda e: entry.after(150, lambda: None if lb.focus_get() == lb else hide()), add="+")
+        lb.bind("<Return>", pick)
+        lb.bind("<Double-Button-1>", pick)
+        lb.bind("<Escape>", lambda e: (hide(), entry.focus_set()))
+        lb.bind("<FocusOut>", lambda e: hide())
+
     def format_phone_input(self, event):
         # Avto-format: +998 (99) 123-45-67
         entry = event.widget
@@ -1985,6 +4707,7 @@ class MahallaDasturi:
     def show_context_menu(self, event):
         item = self.tree.identify_row(event.y)
         if item: 
+            self.table_selected = {item} # Oynadan tashqaridagi tanlov ham bekor
             self.tree.selection_set(item)
             # Recreate menu to include Delete
             self.context_menu = tk.Menu(self.root, tearoff=0, font=("Segoe UI", 14))
@@ -2006,7 +4729,7 @@ class MahallaDasturi:
         if self.current_role != "admin" and self.current_role != "operator":
              return # Should not happen usually
 
-        sel = self.tree.selection()
+        sel = self.table_selection()
         if not sel: return
         
         count = len(sel)
@@ -2014,16 +4737,12 @@ class MahallaDasturi:
         
         updated = False
         for s in sel:
-             v = self.tree.item(s)["values"]
-             # Find item by INN (unique)
-             inn_val = str(v[5]) # INN is at index 5 now
-             item = next((i for i in self.data if i.get("inn") == inn_val), None)
+             item = self.data_manager.get(s) # Qator iid = yozuv uuid
              if item:
-                 item["izoh"] = ""
+                 self.data_manager.update_item(item, {"izoh": ""})
                  updated = True
         
         if updated:
-            self.data_manager.save_data()
             self.filter_data()
             self.sync_background() # Auto Sync
             messagebox.showinfo("Bajarildi", "Izohlar tozalandi!")
@@ -2037,6 +4756,7 @@ class MahallaDasturi:
         
         for item in self.data:
             item["izoh"] = ""
+        self.data_manager.derived.reset()
             
         self.data_manager.save_data()
         self.filter_data()
@@ -2048,16 +4768,15 @@ class MahallaDasturi:
         if self.current_role != "admin":
              messagebox.showerror("Ruxsat Yo'q", "Faqat ADMIN o'chira oladi!"); return
         
-        sel = self.tree.selection()
+        sel = self.table_selection()
         if not sel: return
-        if not messagebox.askyesno("O'chirish", "Haqiqatan ham bu ma'lumotni o'chirmoqchimisiz? (Keyinroq Trashdan tiklashingiz mumkin)"): return
-        
-        v = self.tree.item(sel)["values"]
-        # Find item securely
-        item = next((i for i in self.data if i.get("inn") == str(v[5])), None) # INN is 5
-        if item:
-            self.data_manager.move_to_trash(item)
-            self.data_manager.log_activity(self.current_role, "Chiqindiga tashlandi", f"Nomi: {item.get('m')}")
+        what = "bu ma'lumotni" if len(sel) == 1 else f"{len(sel)} ta ma'lumotni"
+        if not messagebox.askyesno("O'chirish", f"Haqiqatan ham {what} o'chirmoqchimisiz? (Keyinroq Trashdan tiklashingiz mumkin)"): return
+        
+        items = [self.data_manager.get(s) for s in sel] # Qator iid = yozuv uuid
+        if self.data_manager.move_items_to_trash(items):
+            for item in items:
+                if item: self.data_manager.log_activity(self.current_role, "Chiqindiga tashlandi", f"Nomi: {item.get('m')}")
             self.filter_data()
             self.sync_background() # Auto Sync
             messagebox.showinfo("O'chirildi", "Ma'lumot Chiqindi qutisiga joylandi.")
@@ -2069,13 +4788,8 @@ class MahallaDasturi:
 
         sel = self.trash_tree.selection()
         if not sel: return
-        for s in sel:
-            v = self.trash_tree.item(s)["values"]
-            # Find in trash by name and director (simple match)
-            item = next((i for i in self.data_manager.trash if i.get("m") == v[0] and i.get("f") == v[1]), None)
-            if item:
-                self.data_manager.restore_from_trash(item)
-                self.data_manager.log_activity(self.current_role, "Tiklandi", f"Nomi: {item.get('m')}")
+        for item in self.data_manager.restore_items_from_trash([self.trash_rows.get(s) for s in sel]):
+            self.data_manager.log_activity(self.current_role, "Tiklandi", f"Nomi: {item.get('m')}")
         self.show_trash()
         self.filter_data() # Update main table if it's visible
         self.sync_background() # Auto Sync
@@ -2090,12 +4804,8 @@ class MahallaDasturi:
         if not sel: return
         if not messagebox.askyesno("Diqqat", "Rostdan ham butunlay o'chirmoqchimisiz? Qaytarib bo'lmaydi!"): return
         
-        for s in sel:
-            v = self.trash_tree.item(s)["values"]
-            item = next((i for i in self.data_manager.trash if i.get("m") == v[0] and i.get("f") == v[1]), None)
-            if item:
-                self.data_manager.permanent_delete(item)
-                self.data_manager.log_activity(self.current_role, "Butunlay O'chirildi", f"Nomi: {item.get('m')}")
+        for item in self.data_manager.permanent_delete_items([self.trash_rows.get(s) for s in sel]):
+            self.data_manager.log_activity(self.current_role, "Butunlay O'chirildi", f"Nomi: {item.get('m')}")
         self.show_trash()
         self.sync_background() # Auto Sync
 
@@ -2113,7 +4823,7 @@ class MahallaDasturi:
     
     def send_telegram(self):
         try:
-            v = self.tree.item(self.tree.focus())["values"]
+            v = self.tree.item(self.table_focus_row())["values"]
             # Indeks: 0=No, 1=Turi, 2=Nomi, 3=Rahbar, 4=Tel, 5=INN, 6=Izoh
             izoh = f"\n📝 {v[6]}" if v[6] else ""
             # Format: Turi (v1), Nomi (v2), Rahbar (v3), Tel (v4), INN (v5)
@@ -2123,7 +4833,7 @@ class MahallaDasturi:
 
     def show_qr(self):
         try:
-            sel = self.tree.focus()
+            sel = self.table_focus_row()
             if not sel: return
             v = self.tree.item(sel)["values"]
             
@@ -2131,34 +4841,10 @@ class MahallaDasturi:
             # Indeks: 0=No, 1=Turi, 2=Nomi, 3=Rahbar, 4=Tel, 5=INN, 6=Izoh
             raw_tel = str(v[4]) 
             
-            # Faqat raqamlarni ajratib olish
-            digits = "".join(filter(str.isdigit, raw_tel))
-            
-            tel = ""
-            
-            # MANTIQNI KUCHAYTIRISH:
-            # 1. Agar raqamlar ichida "998" ketma-ketligi bo'lsa, o'sha joydan boshlab 12 ta raqamni olamiz.
-            if "998" in digits:
-                start_index = digits.find("998")
-                # 998 dan boshlab 12 ta raqam bormi?
-                if len(digits[start_index:]) >= 12:
-                    tel = "+" + digits[start_index : start_index+12]
-                else:
-                    # 998 bor, lekin 12 ta emas (kaltaroq). Boricha olamiz.
-                    tel = "+" + digits[start_index:]
-            
-            # 2. Agar 998 yo'q bo'lsa, lekin raqam uzunligi 9 ta bo'lsa (lokal)
-            elif len(digits) == 9:
-                tel = "+998" + digits
-                
-            # 3. Agar 998 yo'q, lekin 9 tadan ko'p bo'lsa (masalan 835... va oxirida 901234567)
-            # Biz oxirgi 9 ta raqamni olamiz, chunki O'zbekiston raqami 9 ta (kodsiz)
-            elif len(digits) > 9:
-                tel = "+998" + digits[-9:]
-                
-            else:
-                # Juda qisqa yoki tushunarsiz format. Boricha qoldiramiz.
-                tel = digits
+            # +998XXXXXXXXX: yozuvda bir marta hisoblangan (canonical_phone - 998 dan 12 raqam,
+            # 9 raqam - lokal, 835... kabi uzunida - oxirgi 9 raqam)
+            item = self.data_manager.get(sel)
+            tel = self.data_manager.phone_of(item) if item else canonical_phone(raw_tel)
 
             # QR ma'lumotlarini tayyorlash
             # 835 muammosi: Ba'zi skanerlar "tel:" prefiksini "8335" (T-E-L) deb terib yuboradi.
@@ -2215,6 +4901,7 @@ class MahallaDasturi:
         if self.current_view == "dashboard": self.show_dashboard()
         elif self.current_view == "table": self.show_table()
         elif self.current_view == "settings": self.show_settings()
+        elif self.current_view == "roster": self.show_roster()
         elif self.current_view == "trash": self.show_trash()
     def update_style(self):
         self.style.configure("Treeview", font=("Segoe UI", self.font_size), rowheight=int(self.font_size*2.5))
@@ -0,0 +1,19 @@
+from mahalrai_POP import canonical_phone, phone_query, phone_match
+
+def test_local_numbers_containing_998():
+    # 9 ta raqam - doim lokal, ichida "998" bo'lsa ham
+    assert canonical_phone("99 981 59 90") == "+998999815990"
+    assert canonical_phone("99 982 47 09") == "+998999824709"
+    assert canonical_phone("99 909 98 81") == "+998999099881"
+
+def test_country_code_only_at_start():
+    assert canonical_phone("+998 90 123 45 67") == "+998901234567"
+    assert canonical_phone("00998901234567") == "+998901234567"
+    assert canonical_phone("8 3 90 123 45 67") == "+998901234567"
+
+def test_reverse_lookup():
+    canon = canonical_phone("99 981 59 90")
+    assert phone_match(canon, phone_query("9815990"))
+    assert phone_match(canon, phone_query("815990"))
+    assert phone_match(canonical_phone("99 909 98 81"), phone_query("99 909 98 81"))
+    assert not phone_match(canonical_phone("90 123 45 81"), phone_query("99 909 98 81"))